@@ -0,0 +1,97 @@
+from mmap import mmap, ACCESS_READ
+from hashlib import blake2b
+from struct import Struct
+from storage_io_handler import StorageIOHandler
+
+
+class BinaryStorageHandler:
+    # file layout: header, length prefixed (key, service name, password)
+    # records, offset table of (key hash, record position) sorted by hash
+    _magic = b"PWMS"
+    _version = 1
+    _header_struct = Struct("<4sHHQQ")
+    _length_struct = Struct("<H")
+    _offset_table_entry_struct = Struct("<QQ")
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.rows_num, self._offset_table_position, self._mmap = 0, None, None
+        try:
+            with open(file_path, "rb") as f:
+                self._mmap = mmap(f.fileno(), 0, access=ACCESS_READ)
+        except FileNotFoundError:
+            return
+        magic, version, _, self.rows_num, self._offset_table_position = BinaryStorageHandler._header_struct.unpack_from(
+            self._mmap
+        )
+        if magic != BinaryStorageHandler._magic or version != BinaryStorageHandler._version:
+            self.close()
+            raise ValueError(f"'{file_path}' is not a binary storage file")
+
+    @staticmethod
+    def _hash_key(key):
+        return int.from_bytes(blake2b(key.encode(), digest_size=8).digest(), "little")
+
+    def _read_record(self, position):
+        record = []
+        for i in range(3):
+            (length,) = BinaryStorageHandler._length_struct.unpack_from(self._mmap, position)
+            position += BinaryStorageHandler._length_struct.size
+            record.append(self._mmap[position:position + length].decode())
+            position += length
+        return (*record, position)
+
+    def _read_offset_table_entry(self, i):
+        return BinaryStorageHandler._offset_table_entry_struct.unpack_from(
+            self._mmap,
+            self._offset_table_position + i * BinaryStorageHandler._offset_table_entry_struct.size
+        )
+
+    def lookup(self, key):
+        key_hash = BinaryStorageHandler._hash_key(key)
+        lo, hi = 0, self.rows_num
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._read_offset_table_entry(mid)[0] < key_hash:
+                lo = mid + 1
+            else:
+                hi = mid
+        while lo < self.rows_num:
+            entry_key_hash, position = self._read_offset_table_entry(lo)
+            if entry_key_hash != key_hash:
+                break
+            record_key, service_name, pwd, _ = self._read_record(position)
+            if record_key == key:
+                return service_name, pwd
+            lo += 1
+
+    def __iter__(self):
+        position = BinaryStorageHandler._header_struct.size
+        for i in range(self.rows_num):
+            key, service_name, pwd, position = self._read_record(position)
+            yield key, service_name, pwd
+
+    def close(self):
+        if self._mmap:
+            self._mmap.close()
+            self._mmap = None
+
+    @classmethod
+    def write(cls, file_path, keyed_rows):
+        offset_table = []
+        with StorageIOHandler.atomic_write(file_path, "wb") as f:
+            position = cls._header_struct.size
+            f.write(b"\0" * position)
+            for key, service_name, pwd in keyed_rows:
+                record = b"".join(
+                    cls._length_struct.pack(len(b)) + b
+                    for b in (key.encode(), service_name.encode(), pwd.encode())
+                )
+                offset_table.append((cls._hash_key(key), position))
+                f.write(record)
+                position += len(record)
+            offset_table.sort()
+            for e in offset_table:
+                f.write(cls._offset_table_entry_struct.pack(*e))
+            f.seek(0)
+            f.write(cls._header_struct.pack(cls._magic, cls._version, 0, len(offset_table), position))
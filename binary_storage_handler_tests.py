@@ -0,0 +1,51 @@
+from binary_storage_handler import BinaryStorageHandler
+from tempfile import TemporaryDirectory
+import unittest
+
+
+class TestBinaryStorageHandler(unittest.TestCase):
+    def setUp(self):
+        self.data_directory = TemporaryDirectory()
+        self.addCleanup(self.data_directory.cleanup)
+        self.file_path = f"{self.data_directory.name}/storage.bin"
+        self.keyed_rows = [
+            (f"key{i}", f"service{i}", f"pwd{i}") for i in range(100)
+        ]
+
+    def _write_and_open(self):
+        BinaryStorageHandler.write(self.file_path, self.keyed_rows)
+        binary_storage = BinaryStorageHandler(self.file_path)
+        self.addCleanup(binary_storage.close)
+        return binary_storage
+
+    def test_lookup_and_iter(self):
+        binary_storage = self._write_and_open()
+        self.assertEqual(binary_storage.rows_num, 100)
+        self.assertEqual(list(binary_storage), self.keyed_rows)
+        for key, service_name, pwd in self.keyed_rows:
+            self.assertEqual(binary_storage.lookup(key), (service_name, pwd))
+        self.assertIsNone(binary_storage.lookup("missing"))
+
+    def test_lookup_with_hash_collisions(self):
+        hash_key = BinaryStorageHandler._hash_key
+        BinaryStorageHandler._hash_key = staticmethod(lambda key: len(key))
+        self.addCleanup(setattr, BinaryStorageHandler, "_hash_key", staticmethod(hash_key))
+        binary_storage = self._write_and_open()
+        self.assertEqual(binary_storage.lookup("key42"), ("service42", "pwd42"))
+        self.assertIsNone(binary_storage.lookup("key00"))
+
+    def test_missing_file_is_empty(self):
+        binary_storage = BinaryStorageHandler(self.file_path)
+        self.assertEqual(binary_storage.rows_num, 0)
+        self.assertEqual(list(binary_storage), [])
+        self.assertIsNone(binary_storage.lookup("key"))
+
+    def test_not_a_binary_storage_file(self):
+        with open(self.file_path, "wb") as f:
+            f.write(b"Service name,Password\r\n" * 2)
+        with self.assertRaises(ValueError):
+            BinaryStorageHandler(self.file_path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,18 @@
-from random import choice, randint
+from contextlib import contextmanager
+from itertools import chain, repeat
 from string import ascii_letters
+from os import cpu_count, urandom
+
+
+class _TranslationTable(dict):
+    # str.translate deletes the characters mapped to None, so characters
+    # outside the alphabet can be detected by a length mismatch
+    def __missing__(self, key):
+        return None
+
+
+def _translate_chunk(table, strings):
+    return [CryptographyHandler._translate(s, table) for s in strings]
 
 
 class CryptographyHandler:
@@ -8,62 +21,173 @@ class CryptographyHandler:
         "-", "_", "#", "@",
         *(str(n) for n in range(10))
     )
+    _allowed_chars_indexes = {c: i for i, c in enumerate(_allowed_chars_tuple)}
 
-    def __init__(self, secret_key=None):
+    # random bytes below 198 (3 * 66) map uniformly on the allowed chars,
+    # the others are deleted by bytes.translate
+    _random_bytes_table = "".join(_allowed_chars_tuple * 3).encode().ljust(256, b"-")
+    _rejected_random_bytes = bytes(range(len(_allowed_chars_tuple) * 3, 256))
+
+    _parallel_threshold = 100_000
+
+    def __init__(self, secret_key=None, workers=None, chunk_size=10_000):
+        self.workers = workers or cpu_count() or 1
+        self.chunk_size = chunk_size
+        self._executor, self._keep_executor = None, False
         self.numeric_secret_key = CryptographyHandler._calc_numeric_secret_key(
             secret_key
         )
+        self._crypt_table = CryptographyHandler._build_translation_table(
+            self.numeric_secret_key
+        )
+        self._decrypt_table = CryptographyHandler._build_translation_table(
+            -self.numeric_secret_key if self.numeric_secret_key else None
+        )
+        self._normalize_table = CryptographyHandler._build_normalization_table(
+            self.numeric_secret_key
+        )
 
     @classmethod
     def _calc_numeric_secret_key(cls, secret_key):
         if secret_key:
-            return sum((cls._allowed_chars_tuple.index(c) for c in secret_key))
+            try:
+                return sum(map(cls._allowed_chars_indexes.__getitem__, secret_key))
+            except KeyError as e:
+                raise ValueError(f"the secret key contains a character that is not allowed: {e}")
         return secret_key
 
     @classmethod
-    def _gen_payload(cls):
-        return "".join((choice(cls._allowed_chars_tuple) for x in range(5)))
+    def _build_translation_table(cls, shift):
+        if shift:
+            allowed_chars_number = len(cls._allowed_chars_tuple)
+            return _TranslationTable(
+                (
+                    ord(c),
+                    cls._allowed_chars_tuple[(i + shift) % allowed_chars_number]
+                )
+                for i, c in enumerate(cls._allowed_chars_tuple)
+            )
+
+    @classmethod
+    def _build_normalization_table(cls, shift):
+        # maps a crypted char to the crypted lowercase version of its plain char
+        if shift:
+            allowed_chars_number = len(cls._allowed_chars_tuple)
+            return _TranslationTable(
+                (
+                    ord(c),
+                    cls._allowed_chars_tuple[
+                        (
+                            cls._allowed_chars_indexes[
+                                cls._allowed_chars_tuple[(i - shift) % allowed_chars_number].lower()
+                            ] + shift
+                        ) % allowed_chars_number
+                    ]
+                )
+                for i, c in enumerate(cls._allowed_chars_tuple)
+            )
+
+    @staticmethod
+    def _translate(s, table):
+        translated = s.translate(table)
+        if len(translated) != len(s):
+            raise ValueError(
+                "the string contains characters that cannot be encrypted"
+            )
+        return translated
+
+    @classmethod
+    def _gen_random_chars(cls, chars_num):
+        random_chars = b""
+        while len(random_chars) < chars_num:
+            random_chars += urandom(
+                (chars_num - len(random_chars)) * 4 // 3 + 16
+            ).translate(cls._random_bytes_table, cls._rejected_random_bytes)
+        return random_chars[:chars_num].decode()
+
+    @staticmethod
+    def _gen_random_ints(ints_num):
+        return memoryview(urandom(4 * ints_num)).cast("I")
 
     @classmethod
     def gen_pwd(cls, service_name):
-        return f"{cls._gen_payload()}{cls._rand_capitalize(service_name)}{cls._gen_payload()}"
+        return cls.gen_pwds((service_name,))[0]
+
+    @classmethod
+    def gen_pwds(cls, service_names):
+        service_names = tuple(service_names)
+        payloads = cls._gen_random_chars(10 * len(service_names))
+        random_ints = cls._gen_random_ints(3 * len(service_names))
+        return [
+            f"{payloads[10 * i:10 * i + 5]}{cls._rand_capitalize(n, random_ints[3 * i:3 * i + 3])}{payloads[10 * i + 5:10 * i + 10]}"
+            for i, n in enumerate(service_names)
+        ]
 
     @classmethod
-    def _rand_capitalize(cls, s):
+    def _rand_capitalize(cls, s, random_ints=None):
         uppercase_chars_num = round(len(s) / 2)
         chars_list = list(s.lower())
-        for x in range(3):
-            idx = randint(0, uppercase_chars_num)
+        for random_int in random_ints or cls._gen_random_ints(3):
+            idx = random_int % (uppercase_chars_num + 1)
             chars_list[idx] = chars_list[idx].upper()
         return "".join(chars_list)
 
     def crypt_string(self, s):
         if self.numeric_secret_key:
-            chars_list = list(s)
-            allowed_chars_number = len(
-                CryptographyHandler._allowed_chars_tuple
-            )
-            for i, l in enumerate(chars_list):
-                lidx = CryptographyHandler._allowed_chars_tuple.index(l)
-                nlidx = lidx + self.numeric_secret_key
-                if nlidx < allowed_chars_number:
-                    chars_list[i] = CryptographyHandler._allowed_chars_tuple[nlidx]
-                else:
-                    while nlidx >= allowed_chars_number - 1:
-                        nlidx -= allowed_chars_number
-                    chars_list[i] = CryptographyHandler._allowed_chars_tuple[nlidx]
-            return "".join(chars_list)
+            return CryptographyHandler._translate(s, self._crypt_table)
 
     def decrypt_string(self, s):
         if self.numeric_secret_key:
-            crypted_chars_list = list(s)
-            allowed_chars_number = len(
-                CryptographyHandler._allowed_chars_tuple
+            return CryptographyHandler._translate(s, self._decrypt_table)
+
+    @property
+    def batch_size(self):
+        # strings to translate at once, enough for a chunk per worker and for
+        # the process pool to be used at all
+        return max(self.workers * self.chunk_size, CryptographyHandler._parallel_threshold)
+
+    @contextmanager
+    def parallel_executor(self):
+        # keeps the process pool alive across several crypt_many/decrypt_many calls
+        keep_executor, self._keep_executor = self._keep_executor, True
+        try:
+            yield self
+        finally:
+            self._keep_executor = keep_executor
+            if not keep_executor and self._executor:
+                self._executor.shutdown()
+                self._executor = None
+
+    def _translate_many(self, strings, table):
+        strings = list(strings)
+        if self.workers < 2 or len(strings) < CryptographyHandler._parallel_threshold:
+            return _translate_chunk(table, strings)
+        with self.parallel_executor():
+            if not self._executor:
+                from concurrent.futures import ProcessPoolExecutor
+                self._executor = ProcessPoolExecutor(self.workers)
+            return list(
+                chain.from_iterable(
+                    self._executor.map(
+                        _translate_chunk,
+                        repeat(table),
+                        (
+                            strings[i:i + self.chunk_size]
+                            for i in range(0, len(strings), self.chunk_size)
+                        )
+                    )
+                )
             )
-            for i, l in enumerate(crypted_chars_list):
-                lidx = CryptographyHandler._allowed_chars_tuple.index(l)
-                olidx = lidx - self.numeric_secret_key
-                while olidx < 0:
-                    olidx += allowed_chars_number
-                crypted_chars_list[i] = CryptographyHandler._allowed_chars_tuple[olidx]
-            return "".join(crypted_chars_list)
+
+    def normalize_crypted_string(self, s):
+        # same as crypt_string(decrypt_string(s).lower()) in a single pass
+        if self.numeric_secret_key:
+            return CryptographyHandler._translate(s, self._normalize_table)
+
+    def crypt_many(self, strings):
+        if self.numeric_secret_key:
+            return self._translate_many(strings, self._crypt_table)
+
+    def decrypt_many(self, strings):
+        if self.numeric_secret_key:
+            return self._translate_many(strings, self._decrypt_table)
@@ -0,0 +1,106 @@
+from cryptography_handler import CryptographyHandler
+from random import choice, randint
+from timeit import timeit
+from os import cpu_count
+
+
+class LegacyCryptographyHandler(CryptographyHandler):
+    # per-character tuple scans used before the translation tables
+    def crypt_string(self, s):
+        if self.numeric_secret_key:
+            chars_list = list(s)
+            allowed_chars_number = len(
+                CryptographyHandler._allowed_chars_tuple
+            )
+            for i, l in enumerate(chars_list):
+                lidx = CryptographyHandler._allowed_chars_tuple.index(l)
+                nlidx = lidx + self.numeric_secret_key
+                if nlidx < allowed_chars_number:
+                    chars_list[i] = CryptographyHandler._allowed_chars_tuple[nlidx]
+                else:
+                    while nlidx >= allowed_chars_number - 1:
+                        nlidx -= allowed_chars_number
+                    chars_list[i] = CryptographyHandler._allowed_chars_tuple[nlidx]
+            return "".join(chars_list)
+
+    def decrypt_string(self, s):
+        if self.numeric_secret_key:
+            crypted_chars_list = list(s)
+            allowed_chars_number = len(
+                CryptographyHandler._allowed_chars_tuple
+            )
+            for i, l in enumerate(crypted_chars_list):
+                lidx = CryptographyHandler._allowed_chars_tuple.index(l)
+                olidx = lidx - self.numeric_secret_key
+                while olidx < 0:
+                    olidx += allowed_chars_number
+                crypted_chars_list[i] = CryptographyHandler._allowed_chars_tuple[olidx]
+            return "".join(crypted_chars_list)
+
+
+def legacy_gen_pwd(service_name):
+    # random.choice/randint per character, as before gen_pwds
+    def gen_payload():
+        return "".join((choice(CryptographyHandler._allowed_chars_tuple) for x in range(5)))
+    uppercase_chars_num = round(len(service_name) / 2)
+    chars_list = list(service_name.lower())
+    for x in range(3):
+        idx = randint(0, uppercase_chars_num)
+        chars_list[idx] = chars_list[idx].upper()
+    return f"{gen_payload()}{''.join(chars_list)}{gen_payload()}"
+
+
+def benchmark_crypt(chars_num=1_000_000, repeat=3, secret_key="secret"):
+    s = "".join(choice(CryptographyHandler._allowed_chars_tuple) for x in range(chars_num))
+    legacy, current = LegacyCryptographyHandler(secret_key), CryptographyHandler(secret_key)
+    crypted = current.crypt_string(s)
+    assert crypted == legacy.crypt_string(s)
+    assert current.decrypt_string(crypted) == legacy.decrypt_string(crypted) == s
+    results = {}
+    for name, handler in (("legacy", legacy), ("translation tables", current)):
+        results[name] = (
+            timeit(lambda: handler.crypt_string(s), number=repeat) / repeat,
+            timeit(lambda: handler.decrypt_string(crypted), number=repeat) / repeat
+        )
+    return results
+
+
+def benchmark_crypt_many(strings_num=1_000_000, chunk_size=10_000, max_workers=None, secret_key="secret"):
+    strings = [
+        "".join(choice(CryptographyHandler._allowed_chars_tuple) for x in range(20))
+        for i in range(strings_num)
+    ]
+    parallel_threshold = CryptographyHandler._parallel_threshold
+    CryptographyHandler._parallel_threshold = 0
+    results = {}
+    try:
+        for workers in range(1, (max_workers or cpu_count() or 1) + 1):
+            handler = CryptographyHandler(secret_key, workers=workers, chunk_size=chunk_size)
+            with handler.parallel_executor():
+                handler.crypt_many(strings[:chunk_size])
+                results[workers] = timeit(lambda: handler.crypt_many(strings), number=1)
+    finally:
+        CryptographyHandler._parallel_threshold = parallel_threshold
+    return results
+
+
+def benchmark_gen_pwds(pwds_num=100_000):
+    service_names = [f"service-{i}" for i in range(pwds_num)]
+    return {
+        "legacy gen_pwd": pwds_num / timeit(lambda: [legacy_gen_pwd(n) for n in service_names], number=1),
+        "gen_pwd": pwds_num / timeit(lambda: [CryptographyHandler.gen_pwd(n) for n in service_names], number=1),
+        "gen_pwds": pwds_num / timeit(lambda: CryptographyHandler.gen_pwds(service_names), number=1)
+    }
+
+
+if __name__ == "__main__":
+    for name, (crypt_time, decrypt_time) in benchmark_crypt().items():
+        print(
+            f"{name}: crypt_string {crypt_time * 1000:.2f} ms, decrypt_string {decrypt_time * 1000:.2f} ms (1M chars)"
+        )
+    for workers, crypt_many_time in benchmark_crypt_many().items():
+        print(
+            f"crypt_many with {workers} worker(s): {crypt_many_time * 1000:.2f} ms (1M strings of 20 chars)"
+        )
+    for name, pwds_per_second in benchmark_gen_pwds().items():
+        print(f"{name}: {pwds_per_second:,.0f} passwords/s")
@@ -26,6 +26,17 @@ class TestCryptoPasswordManager(unittest.TestCase):
         self.assertIsInstance(self.pwd, str)
         self.assertEqual(len(self.pwd), 10 + len(self.service_name))
 
+    def test_gen_pwds(self):
+        service_names = ["linkedin", "github", "x"]
+        pwds = self.manager.gen_pwds(service_names)
+        self.assertEqual(len(pwds), len(service_names))
+        for service_name, pwd in zip(service_names, pwds):
+            self.assertEqual(len(pwd), 10 + len(service_name))
+            self.assertEqual(pwd[5:-5].lower(), service_name)
+            self.assertTrue(
+                all(c in CryptographyHandler._allowed_chars_tuple for c in pwd)
+            )
+
     def test_crypt_password(self):
         self.assertEqual(len(self.crypted_pwd), len(self.pwd))
 
@@ -35,6 +46,49 @@ class TestCryptoPasswordManager(unittest.TestCase):
             self.pwd
         )
 
+    def test_crypt_is_a_shift_of_the_allowed_chars(self):
+        allowed_chars = "".join(CryptographyHandler._allowed_chars_tuple)
+        shift = self.manager.numeric_secret_key % len(allowed_chars)
+        self.assertEqual(
+            self.manager.crypt_string(allowed_chars),
+            allowed_chars[shift:] + allowed_chars[:shift]
+        )
+
+    def test_normalize_crypted_string(self):
+        crypted_service_name = self.manager.crypt_string("LinkedIn")
+        self.assertEqual(
+            self.manager.normalize_crypted_string(crypted_service_name),
+            self.manager.crypt_string("linkedin")
+        )
+
+    def test_crypt_not_allowed_chars(self):
+        with self.assertRaises(ValueError):
+            self.manager.crypt_string("linked.in")
+        with self.assertRaises(ValueError):
+            self.manager.decrypt_string("linked.in")
+
+    def test_numeric_secret_key(self):
+        self.assertEqual(
+            CryptographyHandler._calc_numeric_secret_key("secret-key@1"),
+            sum(CryptographyHandler._allowed_chars_tuple.index(c) for c in "secret-key@1")
+        )
+        with self.assertRaises(ValueError):
+            CryptographyHandler("secret.key")
+
+    def test_crypt_many(self):
+        pwds = [self.manager.gen_pwd(f"service{i}") for i in range(50)]
+        parallel_manager = CryptographyHandler("secret", workers=2, chunk_size=8)
+        parallel_threshold = CryptographyHandler._parallel_threshold
+        CryptographyHandler._parallel_threshold = 0
+        try:
+            crypted_pwds = parallel_manager.crypt_many(pwds)
+            decrypted_pwds = parallel_manager.decrypt_many(crypted_pwds)
+        finally:
+            CryptographyHandler._parallel_threshold = parallel_threshold
+        self.assertEqual(crypted_pwds, [self.manager.crypt_string(p) for p in pwds])
+        self.assertEqual(decrypted_pwds, pwds)
+        self.assertEqual(self.manager.crypt_many(pwds), crypted_pwds)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,89 @@
+from storage_io_handler import StorageIOHandler
+from csv import reader, writer
+from os import stat
+
+
+class CsvStorageHandler:
+    # the sidecar index maps the key (normalized crypted service name) of
+    # every row to its byte offset in the csv file, its first line records
+    # the size and mtime of the csv file it was built for
+    _csv_file_headers = ("Service name", "Password")
+
+    def __init__(self, csv_file_path, index_file_path, normalize_service_name):
+        self.csv_file_path = csv_file_path
+        self.index_file_path = index_file_path
+        self._normalize_service_name = normalize_service_name
+        self._offsets, self._csv_file = {}, None
+        try:
+            self._csv_file = open(csv_file_path, "rb")
+        except FileNotFoundError:
+            return
+        if not self._load_index():
+            self._offsets = {
+                self._normalize_service_name(r[0]): offset
+                for offset, r in self._iter_csv_rows()
+            }
+            CsvStorageHandler._write_index(csv_file_path, index_file_path, self._offsets.items())
+
+    @property
+    def rows_num(self):
+        return len(self._offsets)
+
+    @staticmethod
+    def _get_csv_file_key(csv_file_path):
+        s = stat(csv_file_path)
+        return f"{s.st_size}:{s.st_mtime_ns}"
+
+    def _load_index(self):
+        try:
+            with open(self.index_file_path) as f:
+                index_reader = reader(f)
+                if next(index_reader, None) != [CsvStorageHandler._get_csv_file_key(self.csv_file_path)]:
+                    return False
+                self._offsets = {k: int(offset) for k, offset in index_reader}
+                return True
+        except FileNotFoundError:
+            return False
+
+    def _iter_csv_rows(self):
+        with open(self.csv_file_path, "rb") as f:
+            offset = len(f.readline())
+            for l in f:
+                r = l.decode().strip()
+                if r:
+                    yield offset, r.split(",")
+                offset += len(l)
+
+    def lookup(self, key):
+        offset = self._offsets.get(key)
+        if offset is not None:
+            self._csv_file.seek(offset)
+            service_name, pwd = self._csv_file.readline().decode().strip().split(",")
+            return service_name, pwd
+
+    def __iter__(self):
+        if self._csv_file:
+            for offset, r in self._iter_csv_rows():
+                yield self._normalize_service_name(r[0]), r[0], r[1]
+
+    def close(self):
+        if self._csv_file:
+            self._csv_file.close()
+            self._csv_file = None
+
+    @staticmethod
+    def _write_index(csv_file_path, index_file_path, offsets):
+        with StorageIOHandler.atomic_write(index_file_path) as f:
+            index_writer = writer(f)
+            index_writer.writerow((CsvStorageHandler._get_csv_file_key(csv_file_path),))
+            index_writer.writerows(offsets)
+
+    @classmethod
+    def write(cls, csv_file_path, index_file_path, keyed_rows):
+        offsets = []
+        with StorageIOHandler.atomic_write(csv_file_path, "wb") as f:
+            offset = f.write(",".join(cls._csv_file_headers).encode() + b"\r\n")
+            for key, service_name, pwd in keyed_rows:
+                offsets.append((key, offset))
+                offset += f.write(f"{service_name},{pwd}\r\n".encode())
+        cls._write_index(csv_file_path, index_file_path, offsets)
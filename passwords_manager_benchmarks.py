@@ -0,0 +1,271 @@
+from passwords_storage_handler import PasswordStorageHandler
+from cryptography_handler import CryptographyHandler
+from passwords_storage_handler_benchmarks import temporary_data_directory
+from contextlib import redirect_stdout
+from statistics import median
+from time import perf_counter
+from random import Random
+from hashlib import sha512
+from json import load, dump
+from csv import writer
+from io import StringIO
+import tracemalloc
+import platform
+import sys
+
+# regressions smaller than these are noise
+_wall_time_noise_floor = 0.0005
+_peak_memory_noise_floor = 64 * 1024
+
+_gen_pwds_num = 100_000
+_crypt_chars_num = 1_000_000
+_import_rows_num = 10_000
+
+
+def generate_vault(storage_name, rows_num, secret_key="secret", storage_backend=None, storage_format=None, seed=0):
+    # the same seed always gives the same service names and passwords, the
+    # rows are written straight to the backend so that large vaults are fast
+    # to generate
+    rng = Random(seed)
+    allowed_chars = CryptographyHandler._allowed_chars_tuple
+    service_names = [
+        f"{''.join(rng.choices(allowed_chars[:26], k=rng.randint(4, 12)))}-{i}"
+        for i in range(rows_num)
+    ]
+    pwds = [
+        "".join(rng.choices(allowed_chars, k=10 + len(n) // 2)) for n in service_names
+    ]
+    backend = PasswordStorageHandler.get_storage_backend(storage_backend)
+    storage_format = storage_format or backend.storage_formats[0]
+    crypto_handler = CryptographyHandler(secret_key)
+    with crypto_handler.parallel_executor():
+        crypted_service_names = crypto_handler.crypt_many(service_names)
+        crypted_pwds = crypto_handler.crypt_many(pwds)
+    backend.write_storage(
+        storage_name,
+        storage_format,
+        (
+            (crypto_handler.normalize_crypted_string(n), n, p)
+            for n, p in zip(crypted_service_names, crypted_pwds)
+        )
+    )
+    backend.update_storages_index(
+        {
+            "name": storage_name,
+            "secret_key": sha512(secret_key.encode()).hexdigest(),
+            "format": storage_format
+        }
+    )
+    return service_names
+
+
+def _measure(operation, repeat, setup=None):
+    # setup prepares each run, it is neither timed nor traced
+    wall_times = []
+    for i in range(repeat):
+        if setup:
+            setup(i)
+        start = perf_counter()
+        operation(i)
+        wall_times.append(perf_counter() - start)
+    if setup:
+        setup(repeat)
+    # tracing slows the operation down, the peak memory is measured apart
+    tracemalloc.start()
+    try:
+        operation(repeat)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {"wall_time": median(wall_times), "peak_memory": peak_memory}
+
+
+def benchmark_storage_operations(rows_num, repeat=3, storage_backend=None, storage_format=None):
+    results = {}
+    with temporary_data_directory() as data_directory_path, redirect_stdout(StringIO()):
+        service_names = generate_vault("vault", rows_num, storage_backend=storage_backend, storage_format=storage_format)
+        handler = PasswordStorageHandler("vault", "secret", storage_backend=storage_backend)
+        handler.setup_storage()
+
+        def open_storage(i):
+            h = PasswordStorageHandler("vault", handler.secret_key, storage_backend=storage_backend)
+            h.setup_storage()
+            h.check_if_password_stored_by_service_name(service_names[0])
+            h.close()
+
+        def convert_storage(i):
+            storage_formats = handler.storage_backend.storage_formats
+            handler.convert_storage(
+                storage_formats[(storage_formats.index(handler.storage_format) + 1) % len(storage_formats)]
+            )
+
+        # operations run in this order on the same vault, each of them is
+        # given the number of the run to pick different services
+        operations = {
+            "setup_storage": open_storage,
+            "get_storages": lambda i: PasswordStorageHandler.get_storages(storage_backend=handler.storage_backend),
+            "get_stored_passwords_num": lambda i: handler.get_stored_passwords_num(),
+            "check_if_password_stored_by_service_name": lambda i: handler.check_if_password_stored_by_service_name(
+                service_names[i * 7919 % rows_num]
+            ),
+            "store_single_password": lambda i: handler.store_single_password(f"new-service-{i}"),
+            "store_multiple_passwords": lambda i: handler.store_multiple_passwords(
+                [f"new-services-{i}-{j}" for j in range(100)]
+            ),
+            "regenerate_service_password": lambda i: handler.regenerate_service_password(
+                service_names[i * 7907 % rows_num]
+            ),
+            "delete_password_from_storage": lambda i: handler.delete_password_from_storage(
+                service_names[-i - 1], internal_use=True
+            ),
+            "compact_storage": lambda i: handler.compact_storage(wait=True),
+            "decrypt_storage": lambda i: handler.decrypt_storage(
+                output_file_path=f"{data_directory_path}/vault.csv"
+            ),
+            "rekey_storage": lambda i: handler.rekey_storage(f"secret-{i}"),
+        }
+        if len(handler.storage_backend.storage_formats) > 1:
+            operations["convert_storage"] = convert_storage
+
+        def write_import_file(i):
+            rng = Random(i)
+            with open(f"{data_directory_path}/import-{i}.csv", "w", newline="") as f:
+                writer(f).writerows(
+                    (
+                        ("name", "password"),
+                        *(
+                            (f"imported-{i}-{j}", "".join(rng.choices(CryptographyHandler._allowed_chars_tuple, k=16)))
+                            for j in range(_import_rows_num)
+                        )
+                    )
+                )
+
+        # a storage cannot be migrated twice, every run migrates a vault of
+        # its own, like the one of the other operations
+        migration_storage_backend = (
+            "filesystem"
+            if handler.storage_backend.__class__ is PasswordStorageHandler._storage_backend_classes["sqlite"]
+            else "sqlite"
+        )
+
+        def migrate_storage(i):
+            h = PasswordStorageHandler(f"vault-{i}", "secret", storage_backend=storage_backend)
+            h.setup_storage()
+            h.migrate_storage(migration_storage_backend)
+            h.close()
+
+        # they run last, so that the imported rows are not counted by the
+        # other operations
+        operations["import_passwords"] = lambda i: handler.import_passwords(
+            f"{data_directory_path}/import-{i}.csv"
+        )
+        operations["migrate_storage"] = migrate_storage
+        setups = {
+            "import_passwords": write_import_file,
+            "migrate_storage": lambda i: generate_vault(
+                f"vault-{i}", rows_num, storage_backend=storage_backend, storage_format=storage_format
+            )
+        }
+        try:
+            for operation_name, operation in operations.items():
+                results[operation_name] = _measure(operation, repeat, setups.get(operation_name))
+        finally:
+            handler.close()
+    return results
+
+
+def benchmark_crypto_operations(repeat=3, secret_key="secret"):
+    rng = Random(0)
+    s = "".join(rng.choices(CryptographyHandler._allowed_chars_tuple, k=_crypt_chars_num))
+    handler = CryptographyHandler(secret_key)
+    crypted = handler.crypt_string(s)
+    service_names = [f"service-{i}" for i in range(_gen_pwds_num)]
+    results = {
+        "crypt_string": _measure(lambda i: handler.crypt_string(s), repeat),
+        "decrypt_string": _measure(lambda i: handler.decrypt_string(crypted), repeat),
+        "gen_pwd": _measure(lambda i: [CryptographyHandler.gen_pwd(n) for n in service_names], repeat)
+    }
+    results["crypt_string"]["chars_per_second"] = _crypt_chars_num / results["crypt_string"]["wall_time"]
+    results["decrypt_string"]["chars_per_second"] = _crypt_chars_num / results["decrypt_string"]["wall_time"]
+    results["gen_pwd"]["passwords_per_second"] = _gen_pwds_num / results["gen_pwd"]["wall_time"]
+    return results
+
+
+def run_benchmarks(rows_nums=(10, 1000, 100_000, 1_000_000), repeat=3, storage_backend=None, storage_format=None):
+    results = benchmark_crypto_operations(repeat)
+    for rows_num in rows_nums:
+        for operation_name, result in benchmark_storage_operations(
+            rows_num, repeat, storage_backend, storage_format
+        ).items():
+            results[f"{operation_name}[{rows_num}]"] = result
+    with temporary_data_directory():
+        # like the benchmarks, without the storage backend environment variable
+        storage_backend_class_name = PasswordStorageHandler.get_storage_backend(storage_backend).__class__.__name__
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "storage_backend": storage_backend_class_name,
+        "storage_format": storage_format,
+        "repeat": repeat,
+        "results": results
+    }
+
+
+def compare_results(results, baseline, tolerance=0.25):
+    # only the benchmarks run in both are compared
+    regressions = []
+    for name, result in results["results"].items():
+        baseline_result = baseline["results"].get(name)
+        if not baseline_result:
+            continue
+        for metric, noise_floor in (("wall_time", _wall_time_noise_floor), ("peak_memory", _peak_memory_noise_floor)):
+            if (
+                result[metric] > baseline_result[metric] * (1 + tolerance)
+                and result[metric] - baseline_result[metric] > noise_floor
+            ):
+                regressions.append((name, metric, baseline_result[metric], result[metric]))
+    return regressions
+
+
+def _build_arguments_parser():
+    from argparse import ArgumentParser
+    parser = ArgumentParser(
+        description="Times the storage and crypto operations on synthetic vaults and compares them with a baseline."
+    )
+    parser.add_argument(
+        "--rows", type=int, nargs="+", default=[10, 1000, 100_000, 1_000_000],
+        help="sizes of the generated vaults (default: 10 1000 100000 1000000)"
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs of each operation (default: 3)")
+    parser.add_argument("--backend", choices=tuple(PasswordStorageHandler._storage_backend_classes), help="storage backend")
+    parser.add_argument("--format", help="storage format (default: the first one of the backend)")
+    parser.add_argument("-o", "--output", help="file to write the JSON results to (default: standard output)")
+    parser.add_argument("--baseline", help="JSON results to compare with, regressions make the run fail")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25,
+        help="allowed slowdown and memory growth over the baseline (default: 0.25)"
+    )
+    return parser
+
+
+def main(argv=None):
+    args = _build_arguments_parser().parse_args(argv)
+    results = run_benchmarks(args.rows, args.repeat, args.backend, args.format)
+    if args.output:
+        with open(args.output, "w") as f:
+            dump(results, f, indent=2)
+    else:
+        dump(results, sys.stdout, indent=2)
+        print()
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_results(results, load(f), args.tolerance)
+        for name, metric, baseline_value, value in regressions:
+            print(f"Regression: {name} {metric} {baseline_value:.6g} -> {value:.6g}", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
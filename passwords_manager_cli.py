@@ -1,10 +1,19 @@
 from string import ascii_letters
-from getpass import getpass
-from cryptography_handler import CryptographyHandler
+from os import environ
+import sys
 from passwords_storage_handler import PasswordStorageHandler
 
 
+def getpass(prompt):
+    # getpass and cryptography_handler are imported lazily to keep the
+    # startup of read-only commands fast
+    from getpass import getpass
+    return getpass(prompt)
+
+
 class PasswordManagerCli:
+    _secret_key_env_variable = "PASSWORDS_MANAGER_SECRET_KEY"
+
     def __init__(self):
         self.storage_handler = None
 
@@ -50,6 +59,20 @@ class PasswordManagerCli:
                 break
         return services
 
+    def _store_multiple_passwords_handler(self, service_names):
+        conflicting_service_names = [
+            n for n in service_names
+            if self.storage_handler.check_if_password_stored_by_service_name(n)
+        ]
+        on_conflict = "skip"
+        if conflicting_service_names:
+            input_message = f"There are already passwords stored for services: {', '.join(conflicting_service_names)} in storage: '{self.storage_handler.storage_name}' ...\nWould you like to override them with newly generated passwords (y/n): "
+            if input(input_message).lower()[0] == "y":
+                on_conflict = "overwrite"
+        self.storage_handler.store_multiple_passwords(
+            service_names, on_conflict=on_conflict
+        )
+
     def _storage_creation_handler(self):
         storage_name = PasswordManagerCli._string_input_handler(
             "storage name",
@@ -72,7 +95,7 @@ class PasswordManagerCli:
         )
         service_names = self._multiple_passwords_generation_input_handler()
         if len(service_names):
-            self.storage_handler.store_multiple_passwords(service_names)
+            self._store_multiple_passwords_handler(service_names)
 
     def _storage_authentication_hanlder(self):
         storage_name = PasswordManagerCli._string_input_handler(
@@ -123,6 +146,7 @@ class PasswordManagerCli:
                 storages = PasswordStorageHandler.get_storages(str_output=True)
                 print(storages if storages else 'There are no storages!')
             elif choice == "4":
+                from cryptography_handler import CryptographyHandler
                 print(
                     f'''Your password is: {
                         CryptographyHandler().gen_pwd(
@@ -151,7 +175,7 @@ class PasswordManagerCli:
     def _update_storage_cli_controller(self):
         i = 0
         while True:
-            menu_options = f"Update storage {self.storage_handler.storage_name}:\n1 - generate and store a secure password for a service\n2 - generate and store secure passwords for multiple services\n3 - change the password for a service\n4 - delete a password from the storage\n5 - decrypt the storage to a csv file\n0 - back\n9 - quit"
+            menu_options = f"Update storage {self.storage_handler.storage_name}:\n1 - generate and store a secure password for a service\n2 - generate and store secure passwords for multiple services\n3 - change the password for a service\n4 - delete a password from the storage\n5 - decrypt the storage to a csv file\n6 - change the secret key of the storage\n0 - back\n9 - quit"
             if not i:
                 print(menu_options)
             choice = input("> ")
@@ -164,7 +188,7 @@ class PasswordManagerCli:
                 self.storage_handler.store_single_password(service_name)
             elif choice == "2":
                 service_names = self._multiple_passwords_generation_input_handler()
-                self.storage_handler.store_multiple_passwords(service_names)
+                self._store_multiple_passwords_handler(service_names)
             elif choice == "3":
                 service_name = self._string_input_handler(
                     "service name",
@@ -185,6 +209,14 @@ class PasswordManagerCli:
                 )
             elif choice == "5":
                 self.storage_handler.decrypt_storage()
+            elif choice == "6":
+                new_secret_key = self._string_input_handler(
+                    "secret key",
+                    "Insert the new secret key you want to encrypt this storage with (do not share it to anyone):\nTYPE HERE",
+                    input_handler=getpass,
+                    allowed_special_characters=("-", "_", "@", "#")
+                )
+                self.storage_handler.rekey_storage(new_secret_key)
             elif not choice or choice.lower() == "menu":
                 if choice:
                     print(menu_options)
@@ -200,5 +232,220 @@ class PasswordManagerCli:
                 i += 1
         return True
 
+    @classmethod
+    def _build_arguments_parser(cls):
+        from argparse import ArgumentParser
+        parser = ArgumentParser(
+            description="A command line tool for generating secure passwords and storing them in encrypted storages. "
+            "Without a command the interactive menu is started.",
+            epilog=f"The secret key of the storage is read from the {cls._secret_key_env_variable} environment variable if it is set, otherwise it is asked for. "
+            f"The storages are kept in the directory set by {PasswordStorageHandler._data_directory_env_variable}, "
+            f"with the backend set by {PasswordStorageHandler._storage_backend_env_variable} (filesystem, memory or sqlite, default: filesystem)."
+        )
+        parser.add_argument(
+            "--profile", action="store_true", help="print the operations and phases timings on exit"
+        )
+        parser.add_argument("--profile-dump", help="file to dump the cProfile stats of the run to")
+        subparsers = parser.add_subparsers(dest="command")
+        subparsers.add_parser("list", help="list the storages")
+        create_parser = subparsers.add_parser("create", help="create a new storage")
+        create_parser.add_argument("storage_name")
+        storage_formats = PasswordStorageHandler.get_storage_backend().storage_formats
+        create_parser.add_argument(
+            "--format",
+            choices=storage_formats,
+            default=storage_formats[0],
+            help=f"on-disk format of the storage (default: {storage_formats[0]})"
+        )
+        convert_parser = subparsers.add_parser("convert", help="convert a storage to another on-disk format")
+        convert_parser.add_argument("storage_name")
+        convert_parser.add_argument("format", choices=storage_formats)
+        add_parser = subparsers.add_parser("add", help="generate and store a password for a service")
+        add_parser.add_argument("storage_name")
+        add_parser.add_argument("service_name")
+        add_many_parser = subparsers.add_parser(
+            "add-many", help="generate and store passwords for the services read one per line from a file or the standard input"
+        )
+        add_many_parser.add_argument("storage_name")
+        add_many_parser.add_argument("-f", "--file", help="file to read the service names from (default: standard input)")
+        for p in (add_parser, add_many_parser):
+            p.add_argument(
+                "--on-conflict",
+                choices=PasswordStorageHandler._conflict_policies,
+                default="skip",
+                help="what to do with services which already have a stored password (default: skip)"
+            )
+        for command, help_msg in (("regen", "re-generate the password of a service"), ("delete", "delete the password of a service")):
+            p = subparsers.add_parser(command, help=help_msg)
+            p.add_argument("storage_name")
+            p.add_argument("service_name")
+        export_parser = subparsers.add_parser("export", help="decrypt a storage to a csv file")
+        export_parser.add_argument("storage_name")
+        export_output_group = export_parser.add_mutually_exclusive_group()
+        export_output_group.add_argument("-o", "--output", help="path of the decrypted csv file")
+        export_output_group.add_argument("--stdout", action="store_true", help="write the decrypted csv to the standard output")
+        export_parser.add_argument("-p", "--pattern", help="only export the services whose name matches this glob pattern")
+        import_parser = subparsers.add_parser(
+            "import", help="import the passwords of a csv file exported by another passwords manager"
+        )
+        import_parser.add_argument("storage_name")
+        import_parser.add_argument("file", help="csv file with a name (or title) and a password column")
+        import_parser.add_argument(
+            "--on-conflict",
+            choices=("skip", "overwrite"),
+            default="skip",
+            help="what to do with services which already have a stored password (default: skip)"
+        )
+        import_parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=PasswordStorageHandler._import_chunk_size,
+            help=f"rows stored and checkpointed at once (default: {PasswordStorageHandler._import_chunk_size})"
+        )
+        import_parser.add_argument(
+            "--restart", action="store_true", help="ignore the checkpoint of an interrupted import of the file"
+        )
+        migrate_parser = subparsers.add_parser(
+            "migrate", help="copy storages, with their index entries, to another storage backend"
+        )
+        migrate_parser.add_argument("storage_names", nargs="*", help="storages to migrate (default: all of them)")
+        migrate_parser.add_argument(
+            "--to",
+            dest="storage_backend",
+            choices=("filesystem", "sqlite"),
+            default="sqlite",
+            help="storage backend to migrate the storages to (default: sqlite)"
+        )
+        return parser
+
+    @classmethod
+    def _read_secret_key(cls, input_description="Insert secret key of the storage:\nTYPE HERE"):
+        secret_key = environ.get(cls._secret_key_env_variable)
+        if secret_key is None:
+            secret_key = getpass(input_description)
+        if not cls._is_valid_string(secret_key, ("-", "_", "@", "#")):
+            raise ValueError("Error! Invalid secret key value (it contains not allowed characters)")
+        return secret_key
+
+    @classmethod
+    def _validate_service_names(cls, service_names):
+        for n in service_names:
+            if not cls._is_valid_string(n, ("-", "_", ".")):
+                raise ValueError(f"Error! Invalid service name value: '{n}' (it contains not allowed characters)")
+        return service_names
+
+    def _open_storage(self, storage_name):
+        if not PasswordStorageHandler.check_storage_existence(storage_name):
+            raise ValueError(f"There are no storages with this name: '{storage_name}'!")
+        self.storage_handler = PasswordStorageHandler(storage_name, self._read_secret_key())
+        self.storage_handler.setup_storage()
+
+    def _run_command(self, args):
+        if args.command == "list":
+            storages = PasswordStorageHandler.get_storages(str_output=True)
+            print(storages if storages else 'There are no storages!')
+        elif args.command == "create":
+            if not self._is_valid_string(args.storage_name, ("-", "_")):
+                raise ValueError("Error! Invalid storage name value (it contains not allowed characters)")
+            if PasswordStorageHandler.check_storage_existence(args.storage_name):
+                raise ValueError("There is already a storage with this name!")
+            self.storage_handler = PasswordStorageHandler(
+                args.storage_name,
+                self._read_secret_key("Insert secret key you want to encrypt this storage with (do not share it to anyone):\nTYPE HERE"),
+                storage_format=args.format
+            )
+            self.storage_handler.setup_storage()
+        elif args.command in ("add", "add-many"):
+            if args.command == "add":
+                service_names = [args.service_name]
+            elif args.file:
+                with open(args.file) as f:
+                    service_names = [l.strip() for l in f if l.strip()]
+            else:
+                service_names = [l.strip() for l in sys.stdin if l.strip()]
+            self._validate_service_names(service_names)
+            self._open_storage(args.storage_name)
+            conflicting_service_names = self.storage_handler.store_multiple_passwords(
+                service_names, on_conflict=args.on_conflict
+            )
+            if conflicting_service_names and args.on_conflict == "skip":
+                print(f"Skipped services with an already stored password: {', '.join(conflicting_service_names)}")
+        elif args.command in ("regen", "delete"):
+            self._validate_service_names([args.service_name])
+            self._open_storage(args.storage_name)
+            if not self.storage_handler.check_if_password_stored_by_service_name(args.service_name):
+                raise ValueError(
+                    f"Error! No passwords found for {args.service_name.lower()} in storage: {args.storage_name}"
+                )
+            if args.command == "regen":
+                self.storage_handler.regenerate_service_password(
+                    args.service_name, direct_usage=True
+                )
+            else:
+                self.storage_handler.delete_password_from_storage(
+                    args.service_name, direct_usage=True
+                )
+        elif args.command == "convert":
+            self._open_storage(args.storage_name)
+            self.storage_handler.convert_storage(args.format)
+        elif args.command == "export":
+            self._open_storage(args.storage_name)
+            if not self.storage_handler.decrypt_storage(
+                output_file_path=args.output,
+                service_name_pattern=args.pattern,
+                to_stdout=args.stdout
+            ):
+                return 1
+        elif args.command == "import":
+            self._open_storage(args.storage_name)
+            self.storage_handler.import_passwords(
+                args.file,
+                on_conflict=args.on_conflict,
+                chunk_size=args.chunk_size,
+                resume=not args.restart
+            )
+        elif args.command == "migrate":
+            # the rows are keyed by the crypted service names, every storage
+            # is opened with its secret key
+            for storage_name in args.storage_names or [s["name"] for s in PasswordStorageHandler.get_storages()]:
+                if self.storage_handler:
+                    self.storage_handler.close()
+                    self.storage_handler = None
+                self._open_storage(storage_name)
+                self.storage_handler.migrate_storage(args.storage_backend)
+
+    def main(self, argv=None):
+        args = PasswordManagerCli._build_arguments_parser().parse_args(argv)
+        if args.profile:
+            from storage_stats_handler import StorageStatsHandler
+            StorageStatsHandler.enable()
+        if args.profile_dump:
+            from cProfile import Profile
+            profile = Profile()
+            profile.enable()
+        try:
+            return self._run(args)
+        finally:
+            if args.profile_dump:
+                profile.disable()
+                profile.dump_stats(args.profile_dump)
+            if args.profile:
+                # on the standard error, so that exports to the standard output stay valid
+                print(StorageStatsHandler.format_stats(), file=sys.stderr)
+
+    def _run(self, args):
+        try:
+            if not args.command:
+                self.main_cli_controller()
+                return 0
+            return self._run_command(args) or 0
+        except (ValueError, OSError) as e:
+            print(e, file=sys.stderr)
+            return 1
+        finally:
+            if self.storage_handler:
+                self.storage_handler.close()
+
 
-PasswordManagerCli().main_cli_controller()
+if __name__ == "__main__":
+    sys.exit(PasswordManagerCli().main())
@@ -0,0 +1,59 @@
+from passwords_storage_handler_benchmarks import temporary_data_directory
+from statistics import median
+from subprocess import run
+from time import perf_counter
+from json import dump
+import os
+import sys
+
+_startup_budget = 0.03
+
+# the CLI is imported rather than run as a script, so that its import time is reported
+_run_cli_code = """
+import sys
+from passwords_manager_cli import PasswordManagerCli
+sys.exit(PasswordManagerCli().main(sys.argv[1:]))
+"""
+
+
+def _run_cli(data_directory_path, *args, python_options=()):
+    return run(
+        (sys.executable, *python_options, "-c", _run_cli_code, *args),
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env={**os.environ, "PASSWORDS_MANAGER_DATA_DIRECTORY": data_directory_path},
+        capture_output=True,
+        text=True,
+        check=True
+    )
+
+
+def benchmark_imports(data_directory_path):
+    import_times = {}
+    for l in _run_cli(data_directory_path, "list", python_options=("-X", "importtime")).stderr.splitlines():
+        if l.startswith("import time:") and "|" in l:
+            self_time, cumulative_time, module_name = l[len("import time:"):].split("|")
+            if module_name.strip() in ("passwords_manager_cli", "passwords_storage_handler", "cryptography_handler"):
+                import_times[module_name.strip()] = int(cumulative_time) / 1e6
+    return import_times
+
+
+def benchmark_list_startup(data_directory_path, runs=20):
+    wall_times = []
+    for i in range(runs):
+        start = perf_counter()
+        _run_cli(data_directory_path, "list")
+        wall_times.append(perf_counter() - start)
+    return min(wall_times), median(wall_times)
+
+
+if __name__ == "__main__":
+    with temporary_data_directory() as data_directory_path:
+        with open(f"{data_directory_path}/storages_index.json", "w") as f:
+            dump({"storages_index": [{"name": f"storage-{i}", "secret_key": ""} for i in range(100)]}, f)
+        for module_name, import_time in benchmark_imports(data_directory_path).items():
+            print(f"import {module_name}: {import_time * 1000:.2f} ms")
+        min_time, median_time = benchmark_list_startup(data_directory_path)
+        print(f"list: {min_time * 1000:.2f} ms min, {median_time * 1000:.2f} ms median wall time")
+        if median_time > _startup_budget:
+            print(f"Startup is over the budget of {_startup_budget * 1000:.0f} ms!")
+            sys.exit(1)
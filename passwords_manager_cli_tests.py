@@ -0,0 +1,109 @@
+from passwords_manager_cli import PasswordManagerCli
+from passwords_storage_handler import PasswordStorageHandler
+from passwords_storage_handler_benchmarks import temporary_data_directory
+from contextlib import redirect_stdout, redirect_stderr
+from csv import reader
+from io import StringIO
+import os
+import unittest
+import unittest.mock
+
+
+class TestPasswordManagerCli(unittest.TestCase):
+    def setUp(self):
+        data_directory = temporary_data_directory()
+        self.data_directory_path = data_directory.__enter__()
+        self.addCleanup(data_directory.__exit__, None, None, None)
+        environ_patch = unittest.mock.patch.dict(
+            os.environ, {PasswordManagerCli._secret_key_env_variable: "secret"}
+        )
+        environ_patch.start()
+        self.addCleanup(environ_patch.stop)
+        self.assertEqual(self._run("create", "work")[0], 0)
+
+    def _run(self, *argv, stdin=None):
+        stdout, stderr = StringIO(), StringIO()
+        with redirect_stdout(stdout), redirect_stderr(stderr), unittest.mock.patch("sys.stdin", StringIO(stdin or "")):
+            exit_code = PasswordManagerCli().main(list(argv))
+        return exit_code, stdout.getvalue(), stderr.getvalue()
+
+    def _export(self, *argv):
+        return self._export_storage("work", *argv)
+
+    def _export_storage(self, storage_name, *argv):
+        exit_code, stdout, stderr = self._run("export", storage_name, "--stdout", *argv)
+        self.assertEqual((exit_code, stderr), (0, ""))
+        rows = list(reader(StringIO(stdout)))
+        self.assertEqual(rows[0], list(PasswordStorageHandler._storage_csv_file_headers))
+        return dict(rows[1:])
+
+    def test_commands(self):
+        self.assertEqual(self._run("create", "work")[::2], (1, "There is already a storage with this name!\n"))
+        self.assertIn("work", self._run("list")[1])
+        self.assertEqual(self._run("add", "work", "github")[0], 0)
+        services_file_path = f"{self.data_directory_path}/services.txt"
+        with open(services_file_path, "w") as f:
+            f.write("GitHub\ngitlab\n\nlinkedin\n")
+        exit_code, stdout, stderr = self._run("add-many", "work", "-f", services_file_path)
+        self.assertEqual(exit_code, 0)
+        self.assertIn("Skipped services with an already stored password: GitHub", stdout)
+        self.assertEqual(self._run("add-many", "work", stdin="google\n")[0], 0)
+        pwds = self._export()
+        self.assertEqual(set(pwds), {"github", "gitlab", "linkedin", "google"})
+
+        self.assertEqual(self._run("regen", "work", "github")[0], 0)
+        self.assertNotEqual(self._export()["github"], pwds["github"])
+        self.assertEqual(self._run("delete", "work", "linkedin")[0], 0)
+        exit_code, stdout, stderr = self._run("delete", "work", "linkedin")
+        self.assertEqual(exit_code, 1)
+        self.assertIn("No passwords found for linkedin", stderr)
+        self.assertEqual(set(self._export("-p", "git*")), {"github", "gitlab"})
+
+        pwds = self._export()
+        self.assertEqual(self._run("convert", "work", "binary")[0], 0)
+        self.assertEqual(self._export(), pwds)
+        output_file_path = f"{self.data_directory_path}/work.csv"
+        self.assertEqual(self._run("export", "work", "-o", output_file_path)[0], 0)
+        with open(output_file_path) as f:
+            self.assertEqual(dict(list(reader(f))[1:]), pwds)
+
+    def test_import(self):
+        source_file_path = f"{self.data_directory_path}/source.csv"
+        with open(source_file_path, "w") as f:
+            f.write("title,username,password\nGitHub,me,Pwd-1\nGitLab,me,Pwd-2\n")
+        self.assertEqual(self._run("import", "work", source_file_path, "--chunk-size", "1")[0], 0)
+        self.assertEqual(self._export(), {"GitHub": "Pwd-1", "GitLab": "Pwd-2"})
+        exit_code, stdout, stderr = self._run("import", "work", f"{self.data_directory_path}/missing.csv")
+        self.assertEqual(exit_code, 1)
+        self.assertIn("missing.csv", stderr)
+
+    def test_migrate(self):
+        self._run("add-many", "work", stdin="github\ngitlab\n")
+        pwds = self._export()
+        self.assertEqual(self._run("migrate", "--to", "sqlite")[0], 0)
+        with unittest.mock.patch.dict(os.environ, {PasswordStorageHandler._storage_backend_env_variable: "sqlite"}):
+            self.assertEqual(self._export(), pwds)
+
+    def test_interactive_session_closes_the_storage(self):
+        # the storage handler is closed, so that a compaction started during
+        # the session is finished before exiting
+        close = PasswordStorageHandler.close
+        with unittest.mock.patch("passwords_manager_cli.getpass", return_value="secret"), \
+                unittest.mock.patch.object(PasswordStorageHandler, "close", autospec=True, side_effect=close) as close_mock:
+            self.assertEqual(self._run(stdin="1\nhome\ny\ngithub\nn\n9\n")[0], 0)
+        close_mock.assert_called_once()
+        self.assertEqual(set(self._export_storage("home")), {"github"})
+
+    def test_errors(self):
+        with unittest.mock.patch.dict(os.environ, {PasswordManagerCli._secret_key_env_variable: "wrong"}):
+            self.assertEqual(self._run("add", "work", "github")[::2], (1, "Incorrect secret key\n"))
+        self.assertEqual(self._run("add", "home", "github")[0], 1)
+        self.assertEqual(self._run("add", "work", "git hub")[0], 1)
+        # a failed export exits with an error, without output on the standard output
+        exit_code, stdout, stderr = self._run("export", "work", "-o", f"{self.data_directory_path}/missing/work.csv")
+        self.assertEqual((exit_code, stdout), (1, ""))
+        self.assertIn("cannot be decrypted", stderr)
+
+
+if __name__ == "__main__":
+    unittest.main()
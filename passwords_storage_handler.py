@@ -1,25 +1,141 @@
-from cryptography_handler import CryptographyHandler
-from json import load, dump
-from hashlib import sha512
-from os import listdir
-from csv import reader, writer
+from storage_backends import FilesystemStorageBackend, MemoryStorageBackend, SqliteStorageBackend
+from storage_io_handler import StorageIOHandler
+from storage_stats_handler import StorageStatsHandler
+from contextlib import contextmanager
+from os import environ, remove, replace, stat
+from os.path import exists, expanduser
+from itertools import chain, islice
+from time import monotonic
+import sys
+
+# cryptography_handler, the storage file handlers, sqlite3, hashlib, csv, threading and fnmatch are imported where
+# they are used, so that read-only commands like listing the storages start fast
 
 
 class PasswordStorageHandler:
-    _data_directory_path = '/Users/toccanen/Desktop/programming/python/exercises/passwords_manager/data'
-    _storages_index_json_file_path = f"{_data_directory_path}/storages_index.json"
+    _data_directory_path = expanduser("~/.passwords_manager")
+    _data_directory_env_variable = "PASSWORDS_MANAGER_DATA_DIRECTORY"
+    _storage_backend_env_variable = "PASSWORDS_MANAGER_STORAGE_BACKEND"
+    _storage_backend_classes = {
+        "filesystem": FilesystemStorageBackend,
+        "memory": MemoryStorageBackend,
+        "sqlite": SqliteStorageBackend
+    }
     _storage_csv_file_headers = ("Service name", "Password")
+    _journal_compaction_threshold = 1024 * 1024
+    _conflict_policies = ("skip", "overwrite", "fail")
+    _import_chunk_size = 10_000
+    # header names, lowercased, of the columns read from the csv files exported by other passwords managers
+    _import_service_name_columns = ("service name", "name", "title", "service")
+    _import_password_columns = ("password", "login_password")
+    _sessions_cache_size = 1024
+    _session_ttl = 300
 
-    def __init__(self, storage_name, secret_key):
+    def __init__(self, storage_name, secret_key, autoflush=True, journal_compaction_threshold=None, storage_format=None, storage_backend=None, data_directory_path=None):
+        self.storage_backend = PasswordStorageHandler.get_storage_backend(
+            storage_backend, data_directory_path
+        )
+        storage_format = storage_format or self.storage_backend.storage_formats[0]
+        if storage_format not in self.storage_backend.storage_formats:
+            raise ValueError(f"Unknown storage format: '{storage_format}'")
         self.storage_name = storage_name
         self.secret_key = secret_key
+        self.autoflush = autoflush
+        self._in_batch = False
+        self.storage_format = storage_format
         self.current_storage, self.crypto_handler = None, None
-        self._storage_csv_file_path = f"{PasswordStorageHandler._data_directory_path}/storages/{storage_name}.csv"
+        self.journal_compaction_threshold = journal_compaction_threshold or PasswordStorageHandler._journal_compaction_threshold
+        self._unflushed_journal_records, self._compaction_thread, self._compaction_lock = [], None, None
+        self._base_storage, self._storage_lock_file = None, None
+        self._reset_loaded_rows()
+        if self.storage_backend.journaled:
+            self._storage_lock_file_path = self.storage_backend.get_storage_file_path(storage_name)
+            self._journal_file_path = self.storage_backend.get_storage_file_path(storage_name, ".journal")
+            self._compacting_journal_file_path = f"{self._journal_file_path}.compacting"
+            self._rekey_file_path = self.storage_backend.get_storage_file_path(storage_name, ".rekey")
+
+    # backends are shared by the handlers using the same data directory, so
+    # that the in-memory storages, the storages index cache and the database
+    # connections outlive the handlers
+    _storage_backends = {}
+
+    @classmethod
+    def get_data_directory_path(cls, data_directory_path=None):
+        return data_directory_path or environ.get(cls._data_directory_env_variable) or cls._data_directory_path
+
+    @classmethod
+    def get_storage_backend(cls, storage_backend=None, data_directory_path=None):
+        storage_backend = storage_backend or environ.get(cls._storage_backend_env_variable, "filesystem")
+        if storage_backend not in cls._storage_backend_classes:
+            raise ValueError(f"Unknown storage backend: '{storage_backend}'")
+        data_directory_path = cls.get_data_directory_path(data_directory_path)
+        storage_backend_key = (storage_backend, data_directory_path)
+        if storage_backend_key not in cls._storage_backends:
+            cls._storage_backends[storage_backend_key] = cls._storage_backend_classes[storage_backend](
+                data_directory_path
+            )
+        return cls._storage_backends[storage_backend_key]
+
+    # authenticated sessions, from (backend, storage name, secret key hash)
+    # to (expiration time, index entry, crypto handler) in least recently
+    # used order, so that authenticating again does not build a new crypto
+    # handler. A session is only used while the index entry is unchanged
+    _sessions = {}
 
     @classmethod
-    def get_storages(cls, str_output=False):
-        with open(cls._storages_index_json_file_path) as f:
-            storages_index = load(f)["storages_index"]
+    def _open_session(cls, storage_name, secret_key, storage_backend):
+        # returns the index entry and the crypto handler of the storage, or
+        # None if there is no storage with this name
+        from hashlib import sha512
+        storage = cls._get_storage(storage_name, storage_backend)
+        secret_key_hash = sha512(secret_key.encode()).hexdigest()
+        session_key = (storage_backend, storage_name, secret_key_hash)
+        session = cls._sessions.pop(session_key, None)
+        if session and session[0] > monotonic() and session[1] == storage:
+            cls._sessions[session_key] = session
+            return session[1:]
+        if not storage:
+            return None
+        if storage["secret_key"] != secret_key_hash:
+            raise ValueError("Incorrect secret key")
+        from cryptography_handler import CryptographyHandler
+        crypto_handler = CryptographyHandler(secret_key)
+        cls._add_session(storage_backend, storage, crypto_handler)
+        return storage, crypto_handler
+
+    @classmethod
+    def _add_session(cls, storage_backend, storage, crypto_handler):
+        cls._sessions[(storage_backend, storage["name"], storage["secret_key"])] = (
+            monotonic() + cls._session_ttl, storage, crypto_handler
+        )
+        if len(cls._sessions) > cls._sessions_cache_size:
+            cls._sessions.pop(next(iter(cls._sessions)), None)
+
+    @classmethod
+    def invalidate_sessions(cls, storage_name=None, storage_backend=None):
+        # drops the sessions of a storage, or of all the storages, when its
+        # secret key is changed or it is deleted. The sessions are shared by
+        # the threads of the storage service, they are copied before iterating
+        for session_key in [
+            k for k in list(cls._sessions)
+            if (storage_name is None or k[1] == storage_name) and (storage_backend is None or k[0] is storage_backend)
+        ]:
+            cls._sessions.pop(session_key, None)
+
+    @classmethod
+    def _load_storages_index(cls, storage_backend=None):
+        return (storage_backend or cls.get_storage_backend()).load_storages_index()
+
+    @classmethod
+    def stats(cls):
+        # operation counters, phases latencies and bytes read and written
+        # since StorageStatsHandler.enable() was called
+        return StorageStatsHandler.stats()
+
+    @classmethod
+    @StorageStatsHandler.timed
+    def get_storages(cls, str_output=False, storage_backend=None):
+        storages_index = list(cls._load_storages_index(storage_backend).values())
         if str_output:
             storage_names = [s["name"] for s in storages_index]
             if len(storage_names) > 1:
@@ -30,82 +146,477 @@ class PasswordStorageHandler:
         return storages_index
 
     @classmethod
-    def _get_storage(cls, storage_name):
-        for s in cls.get_storages():
-            if s["name"] == storage_name:
-                return s
+    def _get_storage(cls, storage_name, storage_backend=None):
+        return cls._load_storages_index(storage_backend).get(storage_name)
 
     @classmethod
-    def check_storage_existence(cls, storage_name):
-        return bool(cls._get_storage(storage_name))
+    @StorageStatsHandler.timed
+    def check_storage_existence(cls, storage_name, storage_backend=None):
+        return bool(cls._get_storage(storage_name, storage_backend))
 
     @classmethod
-    def _authenticate_storage_owner(cls, storage_name, secret_key):
-        return sha512(secret_key.encode()).hexdigest() == cls._get_storage(storage_name)["secret_key"]
+    def _authenticate_storage_owner(cls, storage_name, secret_key, storage_backend=None):
+        from hashlib import sha512
+        return sha512(secret_key.encode()).hexdigest() == cls._get_storage(storage_name, storage_backend)["secret_key"]
+
+    @staticmethod
+    def _get_file_key(file_path):
+        try:
+            s = stat(file_path)
+        except FileNotFoundError:
+            return None
+        return (s.st_ino, s.st_size, s.st_mtime_ns)
+
+    @staticmethod
+    def _read_journal_records(journal_file_path, offset=0):
+        # the journal is bounded by the compaction threshold, it is read at once
+        from csv import reader
+        try:
+            with StorageStatsHandler.phase("io"), open(journal_file_path, "rb") as f:
+                f.seek(offset)
+                journal = f.read()
+        except FileNotFoundError:
+            return []
+        StorageStatsHandler.add_bytes_read(len(journal))
+        with StorageStatsHandler.phase("parse"):
+            # a crash while appending can leave a truncated last record
+            return [
+                r for r in reader(journal[:journal.rfind(b"\n") + 1].decode().splitlines())
+                if len(r) == 3 and r[0] == "put" or len(r) == 2 and r[0] == "del"
+            ]
+
+    @staticmethod
+    def _truncate_partial_journal_record(journal_file):
+        # drops the truncated last record left by a crash, so that the next
+        # record is not appended to it
+        journal_file_size = journal_file.seek(0, 2)
+        if journal_file_size:
+            journal_file.seek(max(journal_file_size - 4096, 0))
+            journal_tail = journal_file.read()
+            if not journal_tail.endswith(b"\n"):
+                journal_file.truncate(
+                    journal_file_size - len(journal_tail) + journal_tail.rfind(b"\n") + 1
+                )
+
+    @contextmanager
+    def _storage_lock(self, shared=False):
+        # reentrant, the outermost acquisition refreshes the loaded rows with
+        # what other processes wrote since they were loaded, a pending
+        # compaction can only be finished under the exclusive lock
+        if self._storage_lock_file:
+            yield
+            return
+        if not self.storage_backend.journaled:
+            if not shared:
+                self._check_current_storage()
+            yield
+            return
+        self._storage_lock_file = StorageIOHandler.acquire_lock(
+            self._storage_lock_file_path, shared=shared and not self._compaction_thread
+        )
+        try:
+            self._check_current_storage()
+            self._refresh_loaded_rows()
+            yield
+        finally:
+            StorageIOHandler.release_lock(self._storage_lock_file)
+            self._storage_lock_file = None
+
+    def _check_current_storage(self):
+        # another handler or process may have rekeyed or converted the
+        # storage since this one was set up, its rows must not be read or
+        # written with the former secret key, nor in the former files
+        storage = PasswordStorageHandler._get_storage(self.storage_name, self.storage_backend)
+        if not self.current_storage or not storage or storage == self.current_storage:
+            return
+        if storage["secret_key"] != self.current_storage["secret_key"]:
+            raise ValueError(
+                f"The secret key of the storage: '{self.storage_name}' has been changed, set it up again with the new one"
+            )
+        self.current_storage = storage
+        storage_format = storage.get("format", self.storage_backend.storage_formats[0])
+        if storage_format != self.storage_format:
+            # the journal was folded in the files of the new format, the
+            # unflushed records are replayed on them
+            self.storage_format = storage_format
+            self._reset_loaded_rows()
+
+    def _refresh_loaded_rows(self):
+        if self._compaction_thread and not self._compaction_thread.is_alive():
+            self._finish_compaction()
+        base_storage_changed = self._base_storage and self._base_storage_file_key != PasswordStorageHandler._get_file_key(
+            self._get_base_storage_file_paths()[0]
+        )
+        if self._journal_rows is not None and not base_storage_changed:
+            journal_file_key = PasswordStorageHandler._get_file_key(self._journal_file_path)
+            if journal_file_key == self._journal_file_key:
+                return
+            if journal_file_key and (
+                not self._journal_file_key
+                or journal_file_key[0] == self._journal_file_key[0] and journal_file_key[1] > self._journal_file_key[1]
+            ):
+                # other processes appended to the journal
+                self._apply_journal_records(
+                    PasswordStorageHandler._read_journal_records(
+                        self._journal_file_path, self._journal_file_key[1] if self._journal_file_key else 0
+                    )
+                )
+                self._apply_journal_records(self._unflushed_journal_records)
+                self._journal_file_key = journal_file_key
+                return
+        elif not base_storage_changed:
+            return
+        # other processes compacted or rewrote the storage
+        if self._compaction_thread:
+            self._finish_compaction()
+        self._reset_loaded_rows()
+
+    def _reset_loaded_rows(self):
+        # rows are looked up by key (the normalized crypted service name, so
+        # no decryption is needed) in the journal rows and then in the base
+        # storage file, through its sidecar index or memory map
+        if self._base_storage:
+            self._base_storage.close()
+        self._base_storage, self._base_storage_file_key = None, None
+        self._journal_rows, self._journal_file_key, self._compacting_journal_rows = None, None, {}
+
+    def _get_base_storage_file_paths(self, storage_format=None):
+        return self.storage_backend.get_storage_file_paths(
+            self.storage_name, storage_format or self.storage_format
+        )
 
+    def _get_base_storage(self):
+        if not self._base_storage:
+            if self.storage_backend.journaled:
+                self._base_storage_file_key = PasswordStorageHandler._get_file_key(
+                    self._get_base_storage_file_paths()[0]
+                )
+            with StorageStatsHandler.phase("io"):
+                self._base_storage = self.storage_backend.open_storage(
+                    self.storage_name, self.storage_format, self.crypto_handler.normalize_crypted_string
+                )
+        return self._base_storage
+
+    def _apply_journal_records(self, journal_records):
+        with StorageStatsHandler.phase("parse"):
+            for r in journal_records:
+                self._journal_rows[
+                    self.crypto_handler.normalize_crypted_string(r[1])
+                ] = (r[1], r[2]) if r[0] == "put" else None
+
+    def _load_journal_rows(self):
+        if self._journal_rows is None:
+            self._journal_rows = {}
+            if not self.storage_backend.journaled:
+                return self._journal_rows
+            self.wait_for_compaction()
+            self._journal_file_key = PasswordStorageHandler._get_file_key(self._journal_file_path)
+            for journal_file_path in (self._compacting_journal_file_path, self._journal_file_path):
+                self._apply_journal_records(
+                    PasswordStorageHandler._read_journal_records(journal_file_path)
+                )
+            self._apply_journal_records(self._unflushed_journal_records)
+        return self._journal_rows
+
+    @staticmethod
+    def _iter_compacted_rows(base_storage, journal_rows):
+        for key, service_name, pwd in base_storage:
+            if key not in journal_rows:
+                yield key, service_name, pwd
+        yield from ((k, *r) for k, r in journal_rows.items() if r)
+
+    def _get_stored_row(self, service_name):
+        return self._get_keyed_stored_row(self.crypto_handler.crypt_string(service_name.lower()))
+
+    def _get_keyed_stored_row(self, key):
+        for journal_rows in (self._load_journal_rows(), self._compacting_journal_rows):
+            if key in journal_rows:
+                return journal_rows[key]
+        return self._get_base_storage().lookup(key)
+
+    def _set_stored_row(self, service_name, stored_row):
+        self._set_stored_rows(((service_name, stored_row),))
+
+    def _set_stored_rows(self, stored_rows):
+        self._set_keyed_stored_rows(
+            [(self.crypto_handler.crypt_string(n.lower()), r) for n, r in stored_rows]
+        )
+
+    def _set_keyed_stored_rows(self, keyed_rows):
+        if self.storage_backend.journaled:
+            self._load_journal_rows().update(keyed_rows)
+        else:
+            self._get_base_storage().put_many(keyed_rows)
+        self._stored_rows_changed([("put", *r) for k, r in keyed_rows])
+
+    def _delete_stored_row(self, service_name):
+        stored_row = self._get_stored_row(service_name)
+        if stored_row:
+            key = self.crypto_handler.crypt_string(service_name.lower())
+            if self.storage_backend.journaled:
+                self._load_journal_rows()[key] = None
+            else:
+                self._get_base_storage().delete(key)
+            self._stored_rows_changed([("del", stored_row[0])])
+        return stored_row
+
+    def _iter_stored_rows(self):
+        # streams the base storage file, only the journal (bounded by the
+        # compaction threshold) is held in memory
+        self.flush()
+        if not self.storage_backend.journaled:
+            yield from ((service_name, pwd) for key, service_name, pwd in self._get_base_storage())
+            return
+        self.wait_for_compaction()
+        with self._storage_lock(shared=True):
+            # keyed like the loaded rows, the del records of merged
+            # compacting journals only have the key
+            journal_rows = {}
+            for journal_file_path in (self._compacting_journal_file_path, self._journal_file_path):
+                for r in PasswordStorageHandler._read_journal_records(journal_file_path):
+                    key = self.crypto_handler.normalize_crypted_string(r[1])
+                    journal_rows.pop(key, None)
+                    journal_rows[key] = (r[1], r[2]) if r[0] == "put" else None
+            base_storage = self._get_base_storage()
+            StorageStatsHandler.add_bytes_read(self._base_storage_file_key[1] if self._base_storage_file_key else 0)
+            for key, service_name, pwd in base_storage:
+                if key not in journal_rows:
+                    yield service_name, pwd
+            yield from (r for r in journal_rows.values() if r)
+
+    def _stored_rows_changed(self, journal_records):
+        # storages of backends without journal are updated in place, the
+        # changes are committed on flush
+        if self.storage_backend.journaled:
+            self._unflushed_journal_records.extend(journal_records)
+        if self.autoflush:
+            self.flush()
+
+    def flush(self):
+        if not self.storage_backend.journaled:
+            if self._base_storage:
+                with StorageStatsHandler.phase("write"):
+                    self._base_storage.commit()
+        elif self._unflushed_journal_records:
+            with self._storage_lock():
+                journal_records = "".join(f"{','.join(r)}\r\n" for r in self._unflushed_journal_records).encode()
+                with StorageStatsHandler.phase("write"), open(self._journal_file_path, "a+b") as f:
+                    PasswordStorageHandler._truncate_partial_journal_record(f)
+                    f.write(journal_records)
+                StorageStatsHandler.add_bytes_written(len(journal_records))
+                self._unflushed_journal_records.clear()
+                journal_file_key = PasswordStorageHandler._get_file_key(self._journal_file_path)
+                if self._journal_rows is not None:
+                    self._journal_file_key = journal_file_key
+                if journal_file_key[1] >= self.journal_compaction_threshold:
+                    self.compact_storage()
+
+    @StorageStatsHandler.timed
+    def compact_storage(self, wait=False):
+        from threading import Thread
+        if not self.storage_backend.journaled:
+            return
+        with self._storage_lock():
+            self.wait_for_compaction()
+            self.flush()
+            # held until the compaction is finished, other processes skip
+            # compacting meanwhile
+            compaction_lock = StorageIOHandler.acquire_lock(
+                self._compacting_journal_file_path, blocking=False
+            )
+            if not compaction_lock:
+                return
+            if not exists(self._journal_file_path) and not exists(self._compacting_journal_file_path):
+                StorageIOHandler.release_lock(compaction_lock)
+                return
+            self._compacting_journal_rows, self._journal_rows = self._load_journal_rows(), {}
+            if exists(self._compacting_journal_file_path):
+                # a previous compaction did not complete, its journal and the
+                # current one are merged and folded by this compaction
+                with StorageIOHandler.atomic_write(self._compacting_journal_file_path) as f:
+                    f.write(
+                        "".join(
+                            f"put,{r[0]},{r[1]}\r\n" if r else f"del,{k}\r\n"
+                            for k, r in self._compacting_journal_rows.items()
+                        )
+                    )
+                if exists(self._journal_file_path):
+                    remove(self._journal_file_path)
+            else:
+                replace(self._journal_file_path, self._compacting_journal_file_path)
+            self._journal_file_key = None
+            self._compaction_lock = compaction_lock
+            self._compaction_thread = Thread(
+                target=self.storage_backend.write_storage,
+                args=(
+                    self.storage_name,
+                    self.storage_format,
+                    PasswordStorageHandler._iter_compacted_rows(
+                        self._get_base_storage(), self._compacting_journal_rows
+                    ),
+                    ".compacted"
+                )
+            )
+            self._compaction_thread.start()
+            StorageStatsHandler.add_bytes_read(self._base_storage_file_key[1] if self._base_storage_file_key else 0)
+            if wait:
+                self.wait_for_compaction()
+
+    def _finish_compaction(self):
+        # the compacted file is written aside by the compaction thread and
+        # put in place under the exclusive storage lock, lookups use the
+        # previous file and the compacting journal rows until then
+        self._compaction_thread.join()
+        self._compaction_thread = None
+        try:
+            base_storage_file_paths = self._get_base_storage_file_paths()
+            if not exists(f"{base_storage_file_paths[0]}.compacted"):
+                # the compaction failed, its journal is replayed and folded
+                # by the next one
+                self._reset_loaded_rows()
+                return
+            for base_storage_file_path in base_storage_file_paths:
+                if exists(f"{base_storage_file_path}.compacted"):
+                    replace(f"{base_storage_file_path}.compacted", base_storage_file_path)
+            self._add_storage_bytes_written(self.storage_backend, self.storage_format)
+            remove(self._compacting_journal_file_path)
+            if self._base_storage:
+                self._base_storage.close()
+            self._base_storage, self._compacting_journal_rows = None, {}
+        finally:
+            StorageIOHandler.release_lock(self._compaction_lock)
+            self._compaction_lock = None
+
+    def wait_for_compaction(self):
+        if self._compaction_thread:
+            with self._storage_lock():
+                if self._compaction_thread:
+                    self._finish_compaction()
+
+    def close(self):
+        self.flush()
+        self.wait_for_compaction()
+        self._reset_loaded_rows()
+
+    def _add_storage_bytes_written(self, storage_backend, storage_format):
+        # only the storage files of journaled backends can be measured
+        if StorageStatsHandler.enabled and storage_backend.journaled:
+            StorageStatsHandler.add_bytes_written(
+                sum(stat(p).st_size for p in storage_backend.get_storage_file_paths(self.storage_name, storage_format))
+            )
+
+    def _write_base_storage(self, keyed_rows, storage_format=None):
+        with StorageStatsHandler.phase("write"):
+            self.storage_backend.write_storage(
+                self.storage_name, storage_format or self.storage_format, keyed_rows
+            )
+        self._add_storage_bytes_written(self.storage_backend, storage_format or self.storage_format)
+
+    @contextmanager
+    def batch(self):
+        # the changes are journaled at once, or made in a single transaction
+        # which is rolled back on errors by backends without journal. Nested
+        # batches are part of the outermost one
+        if self._in_batch:
+            yield self
+            return
+        with self._storage_lock():
+            autoflush, self.autoflush, self._in_batch = self.autoflush, False, True
+            if not self.storage_backend.journaled:
+                self._get_base_storage().begin()
+            try:
+                yield self
+            except BaseException:
+                if not self.storage_backend.journaled:
+                    self._get_base_storage().rollback()
+                raise
+            finally:
+                self.autoflush, self._in_batch = autoflush, False
+                self.flush()
+
+    @StorageStatsHandler.timed
     def get_stored_passwords_num(self):
-        with open(f"{PasswordStorageHandler._data_directory_path}/storages/{self.storage_name}.csv") as f:
-            return len(tuple(reader(f))) - 1
+        with self._storage_lock(shared=True):
+            journal_rows = {**self._compacting_journal_rows, **self._load_journal_rows()}
+            base_storage = self._get_base_storage()
+            return base_storage.rows_num + sum(
+                bool(r) - bool(base_storage.lookup(k)) for k, r in journal_rows.items()
+            )
 
+    @StorageStatsHandler.timed
     def check_if_password_stored_by_service_name(self, service_name):
-        service_name = service_name.lower()
-        with open(f"{PasswordStorageHandler._data_directory_path}/storages/{self.storage_name}.csv") as f:
-            for r in tuple(reader(f))[1:]:
-                if self.crypto_handler.decrypt_string(r[0]).lower() == service_name:
-                    return True
-            return False
+        with self._storage_lock(shared=True):
+            return self._get_stored_row(service_name) is not None
 
     def _create_storage(self):
-        storages_index = PasswordStorageHandler.get_storages()
-        storages_index.append(self.current_storage)
         try:
-            with open(PasswordStorageHandler._storages_index_json_file_path, "w") as f:
-                dump({"storages_index": storages_index}, f)
+            self.storage_backend.update_storages_index(self.current_storage)
         except Exception:
             print("Unexpected exception! Storage not created, try again later.")
         else:
+            PasswordStorageHandler._add_session(self.storage_backend, self.current_storage, self.crypto_handler)
             print("\nStorage successfully created!")
 
+    @StorageStatsHandler.timed
     def setup_storage(self):
-        if PasswordStorageHandler.check_storage_existence(self.storage_name):
-            if PasswordStorageHandler._authenticate_storage_owner(self.storage_name, self.secret_key):
-                self.current_storage = PasswordStorageHandler._get_storage(
-                    self.storage_name
-                )
-                self.crypto_handler = CryptographyHandler(self.secret_key)
-                return self.current_storage
-            raise ValueError("Incorrect secret key")
+        from cryptography_handler import CryptographyHandler
+        from hashlib import sha512
+        self.wait_for_compaction()
+        if self.storage_backend.journaled and exists(self._rekey_file_path):
+            # a rekey was interrupted, it is completed or rolled back before
+            # the secret key is checked against the index entry
+            with self._storage_rewrite_lock():
+                if exists(self._rekey_file_path):
+                    self._finish_rekey()
+        session = PasswordStorageHandler._open_session(self.storage_name, self.secret_key, self.storage_backend)
+        if session:
+            self.current_storage, self.crypto_handler = session
+            self.storage_format = self.current_storage.get("format", self.storage_backend.storage_formats[0])
+            self._reset_loaded_rows()
+            if self.storage_backend.journaled and exists(self._compacting_journal_file_path):
+                # a previous compaction did not complete, it is folded
+                # unless another process is still running it
+                self.compact_storage(wait=True)
+            return self.current_storage
         else:
             self.current_storage = {
                 "name": self.storage_name,
-                "secret_key": sha512(self.secret_key.encode()).hexdigest()
+                "secret_key": sha512(self.secret_key.encode()).hexdigest(),
+                "format": self.storage_format
             }
             self.crypto_handler = CryptographyHandler(self.secret_key)
+            self._reset_loaded_rows()
             self._create_storage()
 
-    def _create_not_existing_storage_csv_file(self):
-        if f"{self.storage_name}.csv" not in listdir(f"{self._data_directory_path}/storages"):
-            open(
-                f"{self._data_directory_path}/storages/{self.storage_name}.csv", "w"
-            ).close()
+    def _store_new_passwords(self, service_names, stored_rows):
+        # stored_rows are the rows, by key, of the services which already
+        # have a password, they are looked up by the callers
+        with StorageStatsHandler.phase("crypt"):
+            crypted_strings = self.crypto_handler.crypt_many(
+                (
+                    *service_names,
+                    *self.crypto_handler.gen_pwds(service_names)
+                )
+            )
+            keyed_rows = []
+            for crypted_service_name, crypted_pwd in zip(
+                crypted_strings[:len(service_names)],
+                crypted_strings[len(service_names):]
+            ):
+                key = self.crypto_handler.normalize_crypted_string(crypted_service_name)
+                # overridden passwords keep the service name as it was first stored
+                stored_row = stored_rows.get(key)
+                keyed_rows.append((key, (stored_row[0] if stored_row else crypted_service_name, crypted_pwd)))
+        with self._storage_lock():
+            self._set_keyed_stored_rows(keyed_rows)
 
+    @StorageStatsHandler.timed
     def store_single_password(self, service_name):
-        self._create_not_existing_storage_csv_file()
-        if not self.check_if_password_stored_by_service_name(service_name):
-            with open(self._storage_csv_file_path) as f:
-                csv_reader = reader(f)
-                rows_to_write = (
-                    self._storage_csv_file_headers,
-                    *(r for i, r in enumerate(csv_reader) if i),
-                    (
-                        self.crypto_handler.crypt_string(service_name),
-                        self.crypto_handler.crypt_string(
-                            self.crypto_handler.gen_pwd(service_name)
-                        )
-                    )
-                )
-            with open(self._storage_csv_file_path, "w") as f:
-                writer(f).writerows(rows_to_write)
+        with self._storage_lock():
+            password_stored = self.check_if_password_stored_by_service_name(service_name)
+            if not password_stored:
+                self._store_new_passwords((service_name,), {})
+        if not password_stored:
             print(f"Password for {service_name} successfully added!")
         else:
             input_message = f"There is already a password stored for service: '{service_name}' in storage: '{self.storage_name}' ...\nWould you like to override it with a newly generated password (y/n): "
@@ -117,110 +628,419 @@ class PasswordStorageHandler:
             else:
                 print("Operation aborted!")
 
-    def store_multiple_passwords(self, service_names):
-        self._create_not_existing_storage_csv_file()
-        new_service_names = []
+    @StorageStatsHandler.timed
+    def store_multiple_passwords(self, service_names, on_conflict="skip"):
+        if on_conflict not in PasswordStorageHandler._conflict_policies:
+            raise ValueError(f"Unknown conflict policy: '{on_conflict}'")
+        requested_service_names = {}
         for n in service_names:
-            if self.check_if_password_stored_by_service_name(n):
-                if input(f"There is already a password stored for service: '{n}' in storage: '{self.storage_name}' ...\nWould you like to override it with a newly generated password (y/n): ").lower()[0] == "y":
-                    self.regenerate_service_password(n)
-            else:
-                new_service_names.append(n)
-        with open(f"{PasswordStorageHandler._data_directory_path}/storages/{self.storage_name}.csv", "r") as f:
-            rows = (
-                PasswordStorageHandler._storage_csv_file_headers,
-                *(
-                    *(r for i, r in enumerate(reader(f)) if i),
-                    *zip(
-                        [
-                            self.crypto_handler.crypt_string(s)
-                            for s in new_service_names
-                        ],
-                        [
-                            self.crypto_handler.crypt_string(
-                                self.crypto_handler.gen_pwd(s)
-                            )
-                            for s in new_service_names
-                        ]
-                    )
+            requested_service_names.setdefault(self.crypto_handler.crypt_string(n.lower()), n)
+        with self.batch():
+            stored_rows = {}
+            for key in requested_service_names:
+                stored_row = self._get_keyed_stored_row(key)
+                if stored_row:
+                    stored_rows[key] = stored_row
+            conflicting_service_names = [requested_service_names[k] for k in stored_rows]
+            if conflicting_service_names and on_conflict == "fail":
+                raise ValueError(
+                    f"There are already passwords stored for: {', '.join(conflicting_service_names)} in storage: '{self.storage_name}'"
                 )
+            self._store_new_passwords(
+                tuple(
+                    n for k, n in requested_service_names.items()
+                    if k not in stored_rows or on_conflict == "overwrite"
+                ),
+                stored_rows
             )
-        with open(self._storage_csv_file_path, "w") as f:
-            writer(f).writerows(rows)
         print(f"\nPasswords successfully saved in the storage!\n")
+        return conflicting_service_names
+
+    @staticmethod
+    def _find_import_column(header, column_names, source_file_path):
+        lowered_header = [c.strip().lower() for c in header]
+        for n in column_names:
+            if n in lowered_header:
+                return lowered_header.index(n)
+        raise ValueError(f"There is no {' or '.join(column_names)} column in: '{source_file_path}'")
+
+    def _load_import_checkpoint(self, checkpoint_file_path, source_file_key):
+        # a checkpoint is only resumed for the same storage and source file
+        from json import load
+        try:
+            with open(checkpoint_file_path) as f:
+                checkpoint = load(f)
+        except FileNotFoundError:
+            return None
+        if checkpoint["storage_name"] == self.storage_name and checkpoint["source_file_key"] == list(source_file_key):
+            return checkpoint
+        print(f"Ignoring the checkpoint: '{checkpoint_file_path}' of another import")
+        return None
+
+    def _get_stored_keys(self):
+        with self._storage_lock(shared=True):
+            stored_keys = {r[0] for r in self._get_base_storage()}
+            for k, r in {**self._compacting_journal_rows, **self._load_journal_rows()}.items():
+                if r:
+                    stored_keys.add(k)
+                else:
+                    stored_keys.discard(k)
+        return stored_keys
+
+    @StorageStatsHandler.timed
+    def import_passwords(self, source_file_path, on_conflict="skip", chunk_size=None, checkpoint_file_path=None, resume=True):
+        # streams a csv exported by another passwords manager in the storage,
+        # its passwords are kept. Every chunk is stored at once and then
+        # checkpointed, an interrupted import resumes after the last one
+        from cryptography_handler import CryptographyHandler
+        from csv import reader
+        from json import dump
+        if on_conflict not in ("skip", "overwrite"):
+            raise ValueError(f"Unknown conflict policy for imports: '{on_conflict}'")
+        chunk_size = chunk_size or PasswordStorageHandler._import_chunk_size
+        checkpoint_file_path = checkpoint_file_path or f"{source_file_path}.checkpoint"
+        source_file_key = PasswordStorageHandler._get_file_key(source_file_path)
+        if not source_file_key:
+            raise ValueError(f"There is no file: '{source_file_path}'")
+        checkpoint = resume and self._load_import_checkpoint(checkpoint_file_path, source_file_key) or {
+            "storage_name": self.storage_name,
+            "source_file_key": list(source_file_key),
+            "offset": 0,
+            "rows_num": 0,
+            "imported_rows_num": 0,
+            "conflicting_rows_num": 0,
+            "invalid_rows_num": 0
+        }
+        allowed_chars = frozenset(CryptographyHandler._allowed_chars_tuple)
+        # conflicts are checked against a single set of keys, imported rows
+        # included, rather than with a lookup per row
+        stored_keys = self._get_stored_keys()
+        with open(source_file_path, "rb") as f:
+            offset = 0
 
+            def iter_lines():
+                # the csv reader does not read ahead, the offset is the end
+                # of the last read row
+                nonlocal offset
+                for l in f:
+                    offset += len(l)
+                    yield l.decode("utf-8-sig")
+
+            source_rows = reader(iter_lines())
+            header = next(source_rows, None)
+            if not header:
+                raise ValueError(f"There is no header in: '{source_file_path}'")
+            service_name_column = PasswordStorageHandler._find_import_column(
+                header, PasswordStorageHandler._import_service_name_columns, source_file_path
+            )
+            password_column = PasswordStorageHandler._find_import_column(
+                header, PasswordStorageHandler._import_password_columns, source_file_path
+            )
+            columns_num = max(service_name_column, password_column) + 1
+            if checkpoint["offset"] > offset:
+                print(f"Resuming the import after {checkpoint['rows_num']:,} rows ...")
+                offset = f.seek(checkpoint["offset"])
+            resumed_rows_num, start = checkpoint["rows_num"], monotonic()
+            reported = start
+
+            def read_chunk():
+                with StorageStatsHandler.phase("parse"):
+                    return list(islice(source_rows, chunk_size))
+
+            for chunk in iter(read_chunk, []):
+                rows = [
+                    (r[service_name_column], r[password_column]) for r in chunk
+                    if len(r) >= columns_num and r[service_name_column] and r[password_column]
+                    and allowed_chars.issuperset(r[service_name_column]) and allowed_chars.issuperset(r[password_column])
+                ]
+                with StorageStatsHandler.phase("crypt"):
+                    crypted_strings = self.crypto_handler.crypt_many(
+                        chain((r[0] for r in rows), (r[1] for r in rows))
+                    )
+                    crypted_rows = [
+                        (self.crypto_handler.normalize_crypted_string(n), n, p)
+                        for n, p in zip(crypted_strings[:len(rows)], crypted_strings[len(rows):])
+                    ]
+                keyed_rows, conflicting_rows_num = {}, 0
+                with self.batch():
+                    for key, crypted_service_name, crypted_pwd in crypted_rows:
+                        if key in stored_keys:
+                            conflicting_rows_num += 1
+                            if on_conflict == "skip":
+                                continue
+                            # overridden passwords keep the service name as it was first stored
+                            stored_row = keyed_rows.get(key) or self._get_keyed_stored_row(key)
+                            crypted_service_name = stored_row[0] if stored_row else crypted_service_name
+                        stored_keys.add(key)
+                        keyed_rows[key] = (crypted_service_name, crypted_pwd)
+                    if keyed_rows:
+                        self._set_keyed_stored_rows(list(keyed_rows.items()))
+                checkpoint["offset"] = offset
+                checkpoint["rows_num"] += len(chunk)
+                checkpoint["imported_rows_num"] += len(keyed_rows)
+                checkpoint["conflicting_rows_num"] += conflicting_rows_num
+                checkpoint["invalid_rows_num"] += len(chunk) - len(rows)
+                with StorageIOHandler.atomic_write(checkpoint_file_path) as cf:
+                    dump(checkpoint, cf)
+                if monotonic() - reported >= 1:
+                    reported = monotonic()
+                    print(
+                        f"{checkpoint['rows_num']:,} rows read, {checkpoint['imported_rows_num']:,} imported ({(checkpoint['rows_num'] - resumed_rows_num) / (reported - start):,.0f} rows/s)"
+                    )
+        if exists(checkpoint_file_path):
+            remove(checkpoint_file_path)
+        elapsed = monotonic() - start
+        print(
+            f"\n{checkpoint['rows_num']:,} rows read from: '{source_file_path}' in {elapsed:.1f} s ({(checkpoint['rows_num'] - resumed_rows_num) / elapsed if elapsed else 0:,.0f} rows/s): {checkpoint['imported_rows_num']:,} imported, {checkpoint['conflicting_rows_num']:,} {'skipped' if on_conflict == 'skip' else 'overwritten'} because already stored, {checkpoint['invalid_rows_num']:,} skipped because of not allowed characters\n"
+        )
+        return {
+            k: checkpoint[k] for k in ("rows_num", "imported_rows_num", "conflicting_rows_num", "invalid_rows_num")
+        }
+
+    @StorageStatsHandler.timed
     def delete_password_from_storage(self, service_name, internal_use=False, direct_usage=False):
-        with open(self._storage_csv_file_path) as f:
-            service_name = service_name.lower()
-            decrypted_rows = [
-                (
-                    self.crypto_handler.decrypt_string(r[0]),
-                    self.crypto_handler.decrypt_string(r[1])
-                )
-                for i, r in enumerate(reader(f)) if i
-            ]
-            updated_rows = [
-                r for r in decrypted_rows if r[0].lower() != service_name
-            ]
-            if len(decrypted_rows) == len(updated_rows):
-                print(
-                    f"Error! No passwords found for {service_name} in storage: {self.storage_name}"
+        with self._storage_lock():
+            deleted_row = self._delete_stored_row(service_name)
+        if not deleted_row:
+            print(
+                f"Error! No passwords found for {service_name.lower()} in storage: {self.storage_name}"
+            )
+        else:
+            if direct_usage:
+                print("\nPassword successfully deleted!\n")
+            if internal_use:
+                return (
+                    self.crypto_handler.decrypt_string(deleted_row[0]),
+                    self.crypto_handler.decrypt_string(deleted_row[1])
                 )
-            else:
-                with open(self._storage_csv_file_path, "w") as f:
-                    writer(f).writerows(
-                        (
-                            PasswordStorageHandler._storage_csv_file_headers,
-                            *[
-                                (
-                                    self.crypto_handler.crypt_string(r[0]),
-                                    self.crypto_handler.crypt_string(r[1])
-                                )
-                                for r in updated_rows
-                            ]
-                        )
-                    )
-                if direct_usage:
-                    print("\nPassword successfully deleted!\n")
-                if internal_use:
-                    return next((r for r in decrypted_rows if r[0].lower() == service_name))
 
+    @StorageStatsHandler.timed
     def regenerate_service_password(self, service_name, direct_usage=False):
-        prev_len = self.get_stored_passwords_num()
-        deleted_service_name = self.delete_password_from_storage(
-            service_name, internal_use=True
-        )[0]
-        last_len = self.get_stored_passwords_num()
-        if prev_len > last_len:
-            with open(self._storage_csv_file_path, "a") as f:
-                writer(f).writerow(
-                    (
-                        self.crypto_handler.crypt_string(deleted_service_name),
-                        self.crypto_handler.crypt_string(
-                            self.crypto_handler.gen_pwd(service_name)
-                        )
-                    )
+        with self._storage_lock():
+            stored_row = self._get_stored_row(service_name)
+            if not stored_row:
+                print(
+                    f"Error! No passwords found for {service_name.lower()} in storage: {self.storage_name}"
                 )
+                return
+            with StorageStatsHandler.phase("crypt"):
+                crypted_pwd = self.crypto_handler.crypt_string(
+                    self.crypto_handler.gen_pwd(service_name)
+                )
+            self._set_stored_row(service_name, (stored_row[0], crypted_pwd))
         if direct_usage:
             print("\nPassword successfully re-generated!\n")
 
-    def decrypt_storage(self):
-        try:
-            with open(self._storage_csv_file_path) as f:
-                with open(f"{PasswordStorageHandler._data_directory_path}/decrypted_storages/{self.storage_name}.csv", "w") as of:
-                    decrypted_rows = [
-                        (
-                            self.crypto_handler.decrypt_string(r[0]),
-                            self.crypto_handler.decrypt_string(r[1])
-                        )
-                        if i else r for i, r in enumerate(reader(f))
+    def _iter_decrypted_rows(self, service_name_pattern=None):
+        from fnmatch import fnmatchcase
+        if service_name_pattern:
+            service_name_pattern = service_name_pattern.lower()
+        stored_rows = self._iter_stored_rows()
+        batch_size = self.crypto_handler.batch_size
+
+        def read_rows_batch():
+            with StorageStatsHandler.phase("io"):
+                return tuple(islice(stored_rows, batch_size))
+
+        with self.crypto_handler.parallel_executor():
+            for rows_batch in iter(read_rows_batch, ()):
+                with StorageStatsHandler.phase("crypt"):
+                    service_names = self.crypto_handler.decrypt_many(r[0] for r in rows_batch)
+                    matching_rows_idxs = [
+                        i for i, n in enumerate(service_names)
+                        if not service_name_pattern or fnmatchcase(n.lower(), service_name_pattern)
                     ]
-                    writer(of).writerows(decrypted_rows)
+                    pwds = self.crypto_handler.decrypt_many(
+                        rows_batch[i][1] for i in matching_rows_idxs
+                    )
+                yield from zip((service_names[i] for i in matching_rows_idxs), pwds)
+
+    @StorageStatsHandler.timed
+    def decrypt_storage(self, output_file_path=None, service_name_pattern=None, to_stdout=False):
+        from csv import writer
+        try:
+            rows = (PasswordStorageHandler._storage_csv_file_headers,)
+            if to_stdout:
+                with StorageStatsHandler.phase("write"):
+                    writer(sys.stdout).writerows(
+                        chain(rows, self._iter_decrypted_rows(service_name_pattern))
+                    )
+            else:
+                output_file_path = output_file_path or self.storage_backend.get_export_file_path(self.storage_name)
+                with StorageStatsHandler.phase("write"), StorageIOHandler.atomic_write(output_file_path) as of:
+                    writer(of).writerows(
+                        chain(rows, self._iter_decrypted_rows(service_name_pattern))
+                    )
+                if StorageStatsHandler.enabled:
+                    StorageStatsHandler.add_bytes_written(stat(output_file_path).st_size)
         except Exception as e:
+            # on the standard error, so that it is not taken for the csv
             print(
-                f"\nUnexpected error, the storage: '{self.storage_name}' cannot be decrypted at the moment, try again later ...\n{e}\n"
+                f"\nUnexpected error, the storage: '{self.storage_name}' cannot be decrypted at the moment, try again later ...\n{e}\n",
+                file=sys.stderr
             )
-        else:
+            return False
+        if not to_stdout:
             print(
-                f"\nStorage: '{self.storage_name}' successfully decrypted!\nYou can find your passwords in this file: '{PasswordStorageHandler._data_directory_path}/decrypted_storages/{self.storage_name}.csv'\n"
+                f"\nStorage: '{self.storage_name}' successfully decrypted!\nYou can find your passwords in this file: '{output_file_path}'\n"
+            )
+        return True
+
+    def _remove_journal(self):
+        if not self.storage_backend.journaled:
+            return
+        for journal_file_path in (self._journal_file_path, self._compacting_journal_file_path):
+            if exists(journal_file_path):
+                remove(journal_file_path)
+
+    @contextmanager
+    def _storage_rewrite_lock(self):
+        # the compaction lock is taken before the storage lock, like the
+        # compactions of other processes do to finish
+        self.wait_for_compaction()
+        if not self.storage_backend.journaled:
+            yield
+            return
+        with StorageIOHandler.locked(self._compacting_journal_file_path), self._storage_lock():
+            yield
+
+    def _finish_rekey(self):
+        # the rekeyed files replace the storage files if the index entry has
+        # the new secret key, otherwise the rekey did not complete and they
+        # are dropped
+        with open(self._rekey_file_path) as f:
+            secret_key_hash = f.read()
+        rekeyed = PasswordStorageHandler._get_storage(
+            self.storage_name, self.storage_backend
+        )["secret_key"] == secret_key_hash
+        for base_storage_file_path in self._get_base_storage_file_paths():
+            if exists(f"{base_storage_file_path}.rekeyed"):
+                if rekeyed:
+                    replace(f"{base_storage_file_path}.rekeyed", base_storage_file_path)
+                else:
+                    remove(f"{base_storage_file_path}.rekeyed")
+        if rekeyed:
+            self._add_storage_bytes_written(self.storage_backend, self.storage_format)
+            # the journal has been folded in the new files and is encrypted with the old key
+            self._remove_journal()
+        remove(self._rekey_file_path)
+        self._reset_loaded_rows()
+
+    @StorageStatsHandler.timed
+    def rekey_storage(self, new_secret_key):
+        from cryptography_handler import CryptographyHandler
+        from hashlib import sha512
+        new_crypto_handler = CryptographyHandler(new_secret_key)
+        decrypted_rows = self._iter_decrypted_rows()
+        batch_size = new_crypto_handler.batch_size
+
+        def iter_crypted_rows():
+            with new_crypto_handler.parallel_executor():
+                for rows_batch in iter(lambda: tuple(islice(decrypted_rows, batch_size)), ()):
+                    with StorageStatsHandler.phase("crypt"):
+                        crypted_strings = new_crypto_handler.crypt_many(
+                            chain.from_iterable(rows_batch)
+                        )
+                        keyed_rows = [
+                            (
+                                new_crypto_handler.normalize_crypted_string(crypted_service_name),
+                                crypted_service_name,
+                                crypted_pwd
+                            )
+                            for crypted_service_name, crypted_pwd in zip(crypted_strings[::2], crypted_strings[1::2])
+                        ]
+                    yield from keyed_rows
+
+        new_storage = {
+            **self.current_storage,
+            "secret_key": sha512(new_secret_key.encode()).hexdigest()
+        }
+        with self._storage_rewrite_lock():
+            if self.storage_backend.journaled:
+                # the rekeyed files are written aside and put in place once
+                # the index entry is updated, the rekey file tells an
+                # interrupted rekey which of them is to be kept
+                with StorageStatsHandler.phase("write"):
+                    self.storage_backend.write_storage(
+                        self.storage_name, self.storage_format, iter_crypted_rows(), ".rekeyed"
+                    )
+                    with StorageIOHandler.atomic_write(self._rekey_file_path) as f:
+                        f.write(new_storage["secret_key"])
+                self.storage_backend.update_storages_index(new_storage)
+                self._finish_rekey()
+            else:
+                # the rows and the index entry are changed in one transaction
+                base_storage = self._get_base_storage()
+                base_storage.begin()
+                try:
+                    self._write_base_storage(iter_crypted_rows())
+                    self.storage_backend.update_storages_index(new_storage)
+                except BaseException:
+                    base_storage.rollback()
+                    raise
+                base_storage.commit()
+            self.current_storage = new_storage
+            PasswordStorageHandler.invalidate_sessions(self.storage_name, self.storage_backend)
+            PasswordStorageHandler._add_session(self.storage_backend, self.current_storage, new_crypto_handler)
+            self.secret_key, self.crypto_handler = new_secret_key, new_crypto_handler
+            self._reset_loaded_rows()
+        print(
+            f"\nThe secret key of the storage: '{self.storage_name}' has been successfully changed!\n"
+        )
+
+    @StorageStatsHandler.timed
+    def migrate_storage(self, storage_backend="sqlite"):
+        # copies the storage, with its index entry, to another backend using
+        # the same data directory
+        target_storage_backend = PasswordStorageHandler.get_storage_backend(
+            storage_backend, self.storage_backend.data_directory_path
+        )
+        if target_storage_backend is self.storage_backend:
+            raise ValueError(f"Storage: '{self.storage_name}' is already in the {storage_backend} backend")
+        if PasswordStorageHandler.check_storage_existence(self.storage_name, target_storage_backend):
+            raise ValueError(f"There is already a storage named: '{self.storage_name}' in the {storage_backend} backend")
+        storage_format = target_storage_backend.storage_formats[0]
+        # the rows are written before the index entry, an interrupted
+        # migration can be run again
+        with StorageStatsHandler.phase("write"):
+            target_storage_backend.write_storage(
+                self.storage_name,
+                storage_format,
+                (
+                    (self.crypto_handler.normalize_crypted_string(r[0]), *r)
+                    for r in self._iter_stored_rows()
+                )
+            )
+        self._add_storage_bytes_written(target_storage_backend, storage_format)
+        target_storage_backend.update_storages_index({**self.current_storage, "format": storage_format})
+        print(f"\nStorage: '{self.storage_name}' successfully migrated to the {storage_backend} backend!\n")
+
+    @StorageStatsHandler.timed
+    def convert_storage(self, storage_format):
+        if storage_format not in self.storage_backend.storage_formats:
+            raise ValueError(f"Unknown storage format: '{storage_format}'")
+        if storage_format == self.storage_format:
+            print(f"\nStorage: '{self.storage_name}' is already in {storage_format} format\n")
+            return
+        with self._storage_rewrite_lock():
+            previous_storage_format = self.storage_format
+            self._write_base_storage(
+                (
+                    (self.crypto_handler.normalize_crypted_string(r[0]), *r)
+                    for r in self._iter_stored_rows()
+                ),
+                storage_format=storage_format
             )
+            self.current_storage = {**self.current_storage, "format": storage_format}
+            self.storage_backend.update_storages_index(self.current_storage)
+            PasswordStorageHandler.invalidate_sessions(self.storage_name, self.storage_backend)
+            PasswordStorageHandler._add_session(self.storage_backend, self.current_storage, self.crypto_handler)
+            # the journal has been folded in the new file, replaying it is
+            # harmless until it is removed
+            self._remove_journal()
+            self.storage_backend.remove_storage(self.storage_name, previous_storage_format)
+            self.storage_format = storage_format
+            self._reset_loaded_rows()
+        print(
+            f"\nStorage: '{self.storage_name}' successfully converted to {storage_format} format!\n"
+        )
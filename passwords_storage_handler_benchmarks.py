@@ -0,0 +1,91 @@
+from passwords_storage_handler import PasswordStorageHandler
+from tempfile import TemporaryDirectory
+from contextlib import contextmanager, redirect_stdout
+from unittest.mock import patch
+from io import StringIO
+from timeit import timeit
+from json import load, dump
+import os
+
+
+@contextmanager
+def temporary_data_directory():
+    # the environment variables would take priority over the data directory
+    with TemporaryDirectory() as data_directory_path, patch.dict(
+        os.environ,
+        {PasswordStorageHandler._data_directory_env_variable: data_directory_path}
+    ), patch.object(PasswordStorageHandler, "_data_directory_path", data_directory_path):
+        os.environ.pop(PasswordStorageHandler._storage_backend_env_variable, None)
+        os.mkdir(f"{data_directory_path}/storages")
+        os.mkdir(f"{data_directory_path}/decrypted_storages")
+        yield data_directory_path
+
+
+def legacy_check_storage_existence(storage_name):
+    # re-reads and scans storages_index.json, as before the index cache
+    with open(PasswordStorageHandler.get_storage_backend().storages_index_file_path) as f:
+        for s in load(f)["storages_index"]:
+            if s["name"] == storage_name:
+                return True
+    return False
+
+
+def benchmark_storages_index_lookup(storages_nums=(10, 100, 1000, 10000), number=200):
+    results = {}
+    for storages_num in storages_nums:
+        with temporary_data_directory():
+            with open(PasswordStorageHandler.get_storage_backend().storages_index_file_path, "w") as f:
+                dump(
+                    {
+                        "storages_index": [
+                            {"name": f"storage-{i}", "secret_key": ""}
+                            for i in range(storages_num)
+                        ]
+                    },
+                    f
+                )
+            storage_name = f"storage-{storages_num - 1}"
+            assert PasswordStorageHandler.check_storage_existence(storage_name)
+            results[storages_num] = (
+                timeit(lambda: legacy_check_storage_existence(storage_name), number=number) / number,
+                timeit(lambda: PasswordStorageHandler.check_storage_existence(storage_name), number=number) / number
+            )
+    return results
+
+
+def _create_storage(storage_name, service_names, storage_format="csv", secret_key="secret"):
+    handler = PasswordStorageHandler(storage_name, secret_key, storage_format=storage_format)
+    with redirect_stdout(StringIO()):
+        handler.setup_storage()
+        handler.store_multiple_passwords(service_names)
+        handler.compact_storage(wait=True)
+    return handler
+
+
+def benchmark_service_lookup(rows_nums=(1000, 10000, 100000), number=5):
+    # cold lookups: a new handler is authenticated and looks up a single service
+    def cold_lookup(storage_name, service_name):
+        handler = PasswordStorageHandler(storage_name, "secret")
+        handler.setup_storage()
+        return handler.check_if_password_stored_by_service_name(service_name)
+
+    results = {}
+    for rows_num in rows_nums:
+        with temporary_data_directory():
+            service_names = [f"service-{i}" for i in range(rows_num)]
+            for storage_format in PasswordStorageHandler.get_storage_backend().storage_formats:
+                _create_storage(storage_format, service_names, storage_format=storage_format)
+                assert cold_lookup(storage_format, service_names[-1])
+                results[(rows_num, storage_format)] = timeit(
+                    lambda: cold_lookup(storage_format, service_names[rows_num // 2]), number=number
+                ) / number
+    return results
+
+
+if __name__ == "__main__":
+    for storages_num, (legacy_time, cached_time) in benchmark_storages_index_lookup().items():
+        print(
+            f"{storages_num} storages: re-read index {legacy_time * 1e6:.1f} us, cached index {cached_time * 1e6:.1f} us per lookup"
+        )
+    for (rows_num, storage_format), lookup_time in benchmark_service_lookup().items():
+        print(f"{rows_num} rows {storage_format} storage: {lookup_time * 1000:.3f} ms per cold service lookup")
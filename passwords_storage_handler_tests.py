@@ -0,0 +1,775 @@
+from passwords_storage_handler import PasswordStorageHandler
+from cryptography_handler import CryptographyHandler
+from concurrent.futures import ProcessPoolExecutor
+from tempfile import TemporaryDirectory
+from contextlib import redirect_stdout
+from csv import reader, writer
+from io import StringIO
+from json import dump
+from multiprocessing import Process
+import os
+import unittest
+import unittest.mock
+
+
+def _store_passwords_concurrently(data_directory_path, worker_id, passwords_num):
+    handler = PasswordStorageHandler(
+        "work", "secret", journal_compaction_threshold=512, data_directory_path=data_directory_path
+    )
+    with redirect_stdout(StringIO()):
+        handler.setup_storage()
+        for i in range(passwords_num):
+            if i % 2:
+                handler.store_single_password(f"worker{worker_id}-service{i}")
+            else:
+                handler.store_multiple_passwords([f"worker{worker_id}-service{i}", "shared"])
+    handler.close()
+
+
+def _clear_environment(test_case):
+    # the environment variables take priority over the patched data
+    # directory, the tests must not use the user's storages
+    environ_patch = unittest.mock.patch.dict(os.environ)
+    environ_patch.start()
+    test_case.addCleanup(environ_patch.stop)
+    for env_variable in (
+        PasswordStorageHandler._data_directory_env_variable, PasswordStorageHandler._storage_backend_env_variable
+    ):
+        os.environ.pop(env_variable, None)
+
+
+class TestPasswordStorageHandler(unittest.TestCase):
+    def setUp(self):
+        _clear_environment(self)
+        self.data_directory = TemporaryDirectory()
+        self.addCleanup(self.data_directory.cleanup)
+        data_directory_path = self.data_directory.name
+        os.mkdir(f"{data_directory_path}/storages")
+        os.mkdir(f"{data_directory_path}/decrypted_storages")
+        previous_data_directory_path = PasswordStorageHandler._data_directory_path
+        PasswordStorageHandler._data_directory_path = data_directory_path
+        self.addCleanup(setattr, PasswordStorageHandler, "_data_directory_path", previous_data_directory_path)
+        self.handler = self._setup_handler("work", "secret")
+
+    def _setup_handler(self, storage_name, secret_key, **kwargs):
+        handler = PasswordStorageHandler(storage_name, secret_key, **kwargs)
+        with redirect_stdout(StringIO()):
+            handler.setup_storage()
+        self.addCleanup(handler.close)
+        return handler
+
+    def _list_storage_files(self):
+        return sorted(
+            n for n in os.listdir(f"{PasswordStorageHandler._data_directory_path}/storages")
+            if not n.endswith(".lock")
+        )
+
+    def _read_storage_csv(self, storage_name="work", directory="storages", extension="csv"):
+        with open(f"{PasswordStorageHandler._data_directory_path}/{directory}/{storage_name}.{extension}") as f:
+            return [r for r in reader(f) if r]
+
+    def test_storages_index_cache(self):
+        self.assertTrue(PasswordStorageHandler.check_storage_existence("work"))
+        self.assertFalse(PasswordStorageHandler.check_storage_existence("home"))
+        storages_index = PasswordStorageHandler.get_storages()
+        with open(f"{PasswordStorageHandler._data_directory_path}/storages_index.json", "w") as f:
+            dump(
+                {"storages_index": [*storages_index, {"name": "home", "secret_key": ""}]},
+                f
+            )
+        self.assertTrue(PasswordStorageHandler.check_storage_existence("home"))
+        self.assertEqual(
+            PasswordStorageHandler.get_storages(str_output=True), "work and home"
+        )
+
+    def test_store_and_reload(self):
+        with redirect_stdout(StringIO()):
+            self.handler.store_multiple_passwords(["linkedin", "GitHub"])
+        reloaded_handler = self._setup_handler("work", "secret")
+        self.assertTrue(
+            reloaded_handler.check_if_password_stored_by_service_name("LinkedIn")
+        )
+        self.assertTrue(
+            reloaded_handler.check_if_password_stored_by_service_name("github")
+        )
+        self.assertEqual(reloaded_handler.get_stored_passwords_num(), 2)
+
+    def test_store_multiple_passwords_conflict_policies(self):
+        with redirect_stdout(StringIO()):
+            self.handler.store_multiple_passwords(["LinkedIn", "github"])
+            stored_row = self.handler._get_stored_row("linkedin")
+            self.assertEqual(
+                self.handler.store_multiple_passwords(["linkedin", "google", "Google"]),
+                ["linkedin"]
+            )
+            self.assertEqual(self.handler._get_stored_row("linkedin"), stored_row)
+            with self.assertRaises(ValueError):
+                self.handler.store_multiple_passwords(["gitlab", "github"], on_conflict="fail")
+            self.assertFalse(self.handler.check_if_password_stored_by_service_name("gitlab"))
+            self.handler.store_multiple_passwords(["linkedin"], on_conflict="overwrite")
+            self.handler.decrypt_storage()
+        overwritten_row = self.handler._get_stored_row("linkedin")
+        self.assertEqual(overwritten_row[0], stored_row[0])
+        self.assertNotEqual(overwritten_row[1], stored_row[1])
+        self.assertEqual(
+            sorted(r[0] for r in self._read_storage_csv(directory="decrypted_storages")[1:]),
+            ["LinkedIn", "github", "google"]
+        )
+
+    def test_wrong_secret_key(self):
+        with self.assertRaises(ValueError):
+            self._setup_handler("work", "not-the-secret")
+
+    def test_sessions_cache(self):
+        handler = self._setup_handler("work", "secret")
+        self.assertIs(handler.crypto_handler, self.handler.crypto_handler)
+        with unittest.mock.patch.object(PasswordStorageHandler, "_session_ttl", 0):
+            PasswordStorageHandler.invalidate_sessions("work")
+            self.assertIsNot(self._setup_handler("work", "secret").crypto_handler, handler.crypto_handler)
+            self.assertIsNot(self._setup_handler("work", "secret").crypto_handler, handler.crypto_handler)
+        # the secret key changed by another process
+        self.handler.storage_backend.update_storages_index(
+            {**self.handler.current_storage, "secret_key": "another-secret-key-hash"}
+        )
+        with self.assertRaises(ValueError):
+            self._setup_handler("work", "secret")
+
+    def test_sessions_cache_size(self):
+        with unittest.mock.patch.dict(PasswordStorageHandler._sessions, clear=True), \
+                unittest.mock.patch.object(PasswordStorageHandler, "_sessions_cache_size", 2):
+            for storage_name in ("work", "home", "work", "school"):
+                self._setup_handler(storage_name, "secret")
+            self.assertEqual([k[1] for k in PasswordStorageHandler._sessions], ["work", "school"])
+
+    def test_delete_and_regenerate(self):
+        with redirect_stdout(StringIO()):
+            self.handler.store_multiple_passwords(["linkedin", "github"])
+            previous_pwd = self.handler.delete_password_from_storage(
+                "github", internal_use=True
+            )[1]
+            self.handler.store_single_password("github")
+            self.handler.regenerate_service_password("GITHUB")
+        self.assertEqual(self.handler.get_stored_passwords_num(), 2)
+        with redirect_stdout(StringIO()):
+            regenerated_row = self.handler.delete_password_from_storage(
+                "github", internal_use=True
+            )
+        self.assertEqual(regenerated_row[0], "github")
+        self.assertNotEqual(regenerated_row[1], previous_pwd)
+        self.assertEqual(
+            self._setup_handler("work", "secret").get_stored_passwords_num(), 1
+        )
+
+    def test_batch_writes_once_on_exit(self):
+        handler = self._setup_handler("work", "secret", autoflush=False)
+        with redirect_stdout(StringIO()):
+            with handler.batch():
+                handler.store_single_password("linkedin")
+                handler.store_single_password("github")
+                self.assertFalse(
+                    os.path.exists(f"{PasswordStorageHandler._data_directory_path}/storages/work.journal")
+                )
+        self.assertEqual(
+            [r[0] for r in self._read_storage_csv(extension="journal")],
+            ["put", "put"]
+        )
+
+    def test_mutations_append_to_journal(self):
+        with redirect_stdout(StringIO()):
+            self.handler.store_single_password("linkedin")
+            self.handler.delete_password_from_storage("linkedin")
+            self.handler.store_single_password("github")
+        self.assertEqual(
+            [r[0] for r in self._read_storage_csv(extension="journal")],
+            ["put", "del", "put"]
+        )
+        self.assertFalse(
+            os.path.exists(f"{PasswordStorageHandler._data_directory_path}/storages/work.csv")
+        )
+        reloaded_handler = self._setup_handler("work", "secret")
+        self.assertFalse(
+            reloaded_handler.check_if_password_stored_by_service_name("linkedin")
+        )
+        self.assertTrue(
+            reloaded_handler.check_if_password_stored_by_service_name("github")
+        )
+
+    def test_journal_compaction(self):
+        handler = self._setup_handler("work", "secret", journal_compaction_threshold=1)
+        with redirect_stdout(StringIO()):
+            handler.store_multiple_passwords(["linkedin", "github"])
+            handler.wait_for_compaction()
+            handler.delete_password_from_storage("github")
+            handler.wait_for_compaction()
+        self.assertEqual(len(self._read_storage_csv()), 2)
+        self.assertFalse(
+            os.path.exists(f"{PasswordStorageHandler._data_directory_path}/storages/work.journal")
+        )
+        self.assertEqual(
+            self._setup_handler("work", "secret").get_stored_passwords_num(), 1
+        )
+
+    def test_interrupted_compaction_is_replayed(self):
+        with redirect_stdout(StringIO()):
+            self.handler.store_single_password("linkedin")
+        storages_directory_path = f"{PasswordStorageHandler._data_directory_path}/storages"
+        os.replace(
+            f"{storages_directory_path}/work.journal",
+            f"{storages_directory_path}/work.journal.compacting"
+        )
+        with redirect_stdout(StringIO()):
+            self.handler.store_single_password("github")
+        reloaded_handler = self._setup_handler("work", "secret")
+        self.assertEqual(reloaded_handler.get_stored_passwords_num(), 2)
+        self.assertFalse(
+            os.path.exists(f"{storages_directory_path}/work.journal.compacting")
+        )
+
+    def test_deleted_rows_of_a_merged_compacting_journal(self):
+        with redirect_stdout(StringIO()):
+            self.handler.store_multiple_passwords(["GitHub", "linkedin"])
+            self.handler.compact_storage(wait=True)
+            self.handler.delete_password_from_storage("github")
+        storages_directory_path = f"{PasswordStorageHandler._data_directory_path}/storages"
+        os.replace(
+            f"{storages_directory_path}/work.journal",
+            f"{storages_directory_path}/work.journal.compacting"
+        )
+        # the compaction of the merged journals fails, the rows are read
+        # from the base storage and the merged compacting journal
+        with redirect_stdout(StringIO()), unittest.mock.patch.object(
+            self.handler.storage_backend, "write_storage", lambda *args: None
+        ):
+            self.handler.store_single_password("google")
+            self.handler.compact_storage(wait=True)
+        self.assertTrue(os.path.exists(f"{storages_directory_path}/work.journal.compacting"))
+        self.assertFalse(self.handler.check_if_password_stored_by_service_name("github"))
+        output_file_path = f"{self.data_directory.name}/export.csv"
+        with redirect_stdout(StringIO()):
+            self.handler.decrypt_storage(output_file_path=output_file_path)
+        with open(output_file_path) as f:
+            self.assertEqual(sorted(r[0] for r in reader(f) if r), ["Service name", "google", "linkedin"])
+
+    def test_decrypt_storage(self):
+        with redirect_stdout(StringIO()):
+            self.handler.store_multiple_passwords(["linkedin"])
+            self.handler.decrypt_storage()
+        decrypted_rows = self._read_storage_csv(directory="decrypted_storages")
+        self.assertEqual(decrypted_rows[0], ["Service name", "Password"])
+        self.assertEqual(decrypted_rows[1][0], "linkedin")
+        self.assertEqual(decrypted_rows[1][1].lower()[5:-5], "linkedin")
+
+    def test_decrypt_storage_streams_base_and_journal(self):
+        handler = self._setup_handler("work", "secret", journal_compaction_threshold=1)
+        with redirect_stdout(StringIO()):
+            handler.store_multiple_passwords(["linkedin", "github", "gitlab"])
+            handler.wait_for_compaction()
+            handler.journal_compaction_threshold = 1024
+            handler.delete_password_from_storage("gitlab")
+            handler.store_single_password("google")
+        output_file_path = f"{PasswordStorageHandler._data_directory_path}/export.csv"
+        with redirect_stdout(StringIO()):
+            handler.decrypt_storage(output_file_path=output_file_path)
+        with open(output_file_path) as f:
+            self.assertEqual(
+                sorted(r[0] for i, r in enumerate(reader(f)) if i and r),
+                ["github", "google", "linkedin"]
+            )
+        output = StringIO()
+        with redirect_stdout(output):
+            handler.decrypt_storage(service_name_pattern="GIT*", to_stdout=True)
+        self.assertEqual(
+            [r[0] for r in reader(StringIO(output.getvalue())) if r],
+            ["Service name", "github"]
+        )
+
+    def test_rekey_storage(self):
+        with redirect_stdout(StringIO()):
+            self.handler.store_multiple_passwords(["linkedin", "github"])
+            self.handler.delete_password_from_storage("github")
+            self.handler.store_single_password("github")
+            self.handler.decrypt_storage()
+            self.handler.rekey_storage("new-secret")
+        previous_decrypted_rows = self._read_storage_csv(directory="decrypted_storages")
+        self.assertFalse(
+            os.path.exists(f"{PasswordStorageHandler._data_directory_path}/storages/work.journal")
+        )
+        with self.assertRaises(ValueError):
+            self._setup_handler("work", "secret")
+        handler = self._setup_handler("work", "new-secret")
+        self.assertEqual(handler.get_stored_passwords_num(), 2)
+        with redirect_stdout(StringIO()):
+            handler.decrypt_storage()
+        self.assertEqual(
+            self._read_storage_csv(directory="decrypted_storages"),
+            previous_decrypted_rows
+        )
+
+    def test_interrupted_rekey(self):
+        with redirect_stdout(StringIO()):
+            self.handler.store_multiple_passwords(["linkedin", "github"])
+            self.handler.compact_storage(wait=True)
+            self.handler.store_single_password("gitlab")
+        stored_row = self.handler._get_stored_row("github")
+        # interrupted before the index entry is updated, the storage keeps
+        # its secret key and the rekeyed files are dropped
+        with unittest.mock.patch.object(
+            self.handler.storage_backend, "update_storages_index", side_effect=OSError
+        ), self.assertRaises(OSError):
+            self.handler.rekey_storage("new-secret")
+        handler = self._setup_handler("work", "secret")
+        self.assertEqual(self._list_storage_files(), ["work.csv", "work.idx", "work.journal"])
+        self.assertEqual(handler._get_stored_row("github"), stored_row)
+        self.assertEqual(handler.get_stored_passwords_num(), 3)
+        # interrupted after it, the rekeyed files are put in place
+        with unittest.mock.patch.object(
+            PasswordStorageHandler, "_finish_rekey", side_effect=OSError
+        ), self.assertRaises(OSError):
+            handler.rekey_storage("new-secret")
+        with self.assertRaises(ValueError):
+            self._setup_handler("work", "secret")
+        self.assertEqual(self._list_storage_files(), ["work.csv", "work.idx"])
+        handler = self._setup_handler("work", "new-secret")
+        self.assertEqual(handler.get_stored_passwords_num(), 3)
+        self.assertTrue(handler.check_if_password_stored_by_service_name("GitLab"))
+
+    def test_large_storages_are_crypted_in_parallel(self):
+        # the rows are read in batches at least as large as the parallel
+        # threshold, smaller ones would never use the process pool
+        with redirect_stdout(StringIO()):
+            self.handler.store_multiple_passwords([f"service{i}" for i in range(30)])
+        with unittest.mock.patch.object(CryptographyHandler, "_parallel_threshold", 20), \
+                unittest.mock.patch.object(self.handler.crypto_handler, "workers", 2), \
+                unittest.mock.patch.object(self.handler.crypto_handler, "chunk_size", 4), \
+                unittest.mock.patch("cryptography_handler.cpu_count", return_value=2), \
+                unittest.mock.patch("concurrent.futures.ProcessPoolExecutor", wraps=ProcessPoolExecutor) as executor_class:
+            self.assertEqual(len(list(self.handler._iter_decrypted_rows())), 30)
+            executor_class.assert_called_once_with(2)
+            with redirect_stdout(StringIO()):
+                self.handler.rekey_storage("new-secret")
+            # one pool decrypts the rows, another one crypts them with the new key
+            self.assertEqual(executor_class.call_count, 3)
+        self.assertEqual(self._setup_handler("work", "new-secret").get_stored_passwords_num(), 30)
+
+    def test_handlers_of_a_converted_storage(self):
+        # a handler set up before the storage was converted by another one
+        # uses the files of the new format
+        stale_handler = self._setup_handler("work", "secret")
+        with redirect_stdout(StringIO()):
+            self.handler.store_multiple_passwords(["linkedin", "github"])
+            self.handler.convert_storage("binary")
+        self.assertTrue(stale_handler.check_if_password_stored_by_service_name("github"))
+        self.assertEqual(stale_handler.storage_format, "binary")
+        with redirect_stdout(StringIO()):
+            stale_handler.store_single_password("zoom")
+            stale_handler.compact_storage(wait=True)
+        self.assertEqual(self._list_storage_files(), ["work.bin"])
+        handler = self._setup_handler("work", "secret")
+        self.assertTrue(handler.check_if_password_stored_by_service_name("zoom"))
+        self.assertEqual(handler.get_stored_passwords_num(), 3)
+
+    def test_binary_storage(self):
+        handler = self._setup_handler(
+            "vault", "secret", storage_format="binary", journal_compaction_threshold=200
+        )
+        self.assertEqual(PasswordStorageHandler._get_storage("vault")["format"], "binary")
+        service_names = [f"service{i}" for i in range(20)]
+        with redirect_stdout(StringIO()):
+            handler.store_multiple_passwords(service_names)
+            handler.wait_for_compaction()
+            handler.delete_password_from_storage("SERVICE3")
+            handler.regenerate_service_password("service4")
+            handler.store_single_password("Extra")
+        self.assertTrue(
+            os.path.exists(f"{PasswordStorageHandler._data_directory_path}/storages/vault.bin")
+        )
+        reloaded_handler = self._setup_handler("vault", "secret")
+        self.assertEqual(reloaded_handler.storage_format, "binary")
+        self.assertEqual(reloaded_handler.get_stored_passwords_num(), 20)
+        self.assertFalse(reloaded_handler.check_if_password_stored_by_service_name("service3"))
+        self.assertTrue(reloaded_handler.check_if_password_stored_by_service_name("extra"))
+        with redirect_stdout(StringIO()):
+            reloaded_handler.compact_storage(wait=True)
+            reloaded_handler.decrypt_storage()
+        self.assertEqual(
+            sorted(r[0] for r in self._read_storage_csv("vault", directory="decrypted_storages")[1:]),
+            sorted(["Extra", *(n for n in service_names if n != "service3")])
+        )
+        self.assertEqual(
+            self._setup_handler("vault", "secret").get_stored_passwords_num(), 20
+        )
+
+    def test_convert_storage(self):
+        with redirect_stdout(StringIO()):
+            self.handler.store_multiple_passwords(["linkedin", "github"])
+            self.handler.decrypt_storage()
+            self.handler.convert_storage("binary")
+        self.assertEqual(self._list_storage_files(), ["work.bin"])
+        decrypted_rows = self._read_storage_csv(directory="decrypted_storages")
+        handler = self._setup_handler("work", "secret")
+        self.assertEqual(handler.storage_format, "binary")
+        with redirect_stdout(StringIO()):
+            handler.store_single_password("google")
+            handler.rekey_storage("new-secret")
+        handler = self._setup_handler("work", "new-secret")
+        self.assertTrue(handler.check_if_password_stored_by_service_name("Google"))
+        with redirect_stdout(StringIO()):
+            handler.delete_password_from_storage("google")
+            handler.convert_storage("csv")
+            handler.decrypt_storage()
+        self.assertEqual(self._list_storage_files(), ["work.csv", "work.idx"])
+        self.assertEqual(
+            self._read_storage_csv(directory="decrypted_storages"), decrypted_rows
+        )
+
+    def _write_import_source(self, rows):
+        source_file_path = f"{self.data_directory.name}/export.csv"
+        with open(source_file_path, "w", newline="") as f:
+            writer(f).writerows([("name", "url", "username", "password"), *rows])
+        return source_file_path
+
+    def _get_stored_password(self, service_name, handler=None):
+        handler = handler or self.handler
+        stored_row = handler._get_stored_row(service_name)
+        return handler.crypto_handler.decrypt_string(stored_row[0]), handler.crypto_handler.decrypt_string(stored_row[1])
+
+    def test_import_passwords(self):
+        with redirect_stdout(StringIO()):
+            self.handler.store_single_password("GitHub")
+            stored_row = self._get_stored_password("github")
+            source_file_path = self._write_import_source(
+                [
+                    ("linkedin", "https://linkedin.com", "me", "pwd-1"),
+                    ("github", "https://github.com", "me", "pwd-2"),
+                    ("not.allowed", "", "me", "pwd-3"),
+                    ("gitlab", "", "me", "pwd.4"),
+                    ("LinkedIn", "", "me", "pwd-5"),
+                    ("google", "", "me", "pwd-6")
+                ]
+            )
+            self.assertEqual(
+                self.handler.import_passwords(source_file_path, chunk_size=4),
+                {"rows_num": 6, "imported_rows_num": 2, "conflicting_rows_num": 2, "invalid_rows_num": 2}
+            )
+            self.assertEqual(self._get_stored_password("github"), stored_row)
+            self.assertEqual(self._get_stored_password("linkedin"), ("linkedin", "pwd-1"))
+            self.assertEqual(self.handler.get_stored_passwords_num(), 3)
+            self.handler.import_passwords(source_file_path, on_conflict="overwrite")
+            # overridden passwords keep the service name as it was first stored
+            self.assertEqual(self._get_stored_password("github"), ("GitHub", "pwd-2"))
+            self.assertEqual(self._get_stored_password("linkedin"), ("linkedin", "pwd-5"))
+            with self.assertRaises(ValueError):
+                self.handler.import_passwords(source_file_path, on_conflict="fail")
+        self.assertFalse(os.path.exists(f"{source_file_path}.checkpoint"))
+
+    def test_import_passwords_resumes(self):
+        source_file_path = self._write_import_source(
+            [(f"service-{i}", "", "", f"pwd-{i}") for i in range(10)]
+        )
+        set_keyed_stored_rows = PasswordStorageHandler._set_keyed_stored_rows
+        calls, interrupted_call = [], [3]
+
+        def interrupted_set_keyed_stored_rows(handler, keyed_rows):
+            calls.append(keyed_rows)
+            if len(calls) == interrupted_call[0]:
+                raise KeyboardInterrupt()
+            set_keyed_stored_rows(handler, keyed_rows)
+
+        with redirect_stdout(StringIO()):
+            with unittest.mock.patch.object(
+                PasswordStorageHandler, "_set_keyed_stored_rows", interrupted_set_keyed_stored_rows
+            ), self.assertRaises(KeyboardInterrupt):
+                self.handler.import_passwords(source_file_path, chunk_size=3)
+            self.assertEqual(self.handler.get_stored_passwords_num(), 6)
+            self.assertTrue(os.path.exists(f"{source_file_path}.checkpoint"))
+            with unittest.mock.patch.object(
+                PasswordStorageHandler, "_set_keyed_stored_rows", interrupted_set_keyed_stored_rows
+            ):
+                calls.clear()
+                interrupted_call[0] = None
+                imported_rows = self.handler.import_passwords(source_file_path, chunk_size=3)
+        # only the rows after the checkpoint are read again
+        self.assertEqual([len(c) for c in calls], [3, 1])
+        self.assertEqual(imported_rows["rows_num"], 10)
+        self.assertEqual(imported_rows["imported_rows_num"], 10)
+        self.assertEqual(self._get_stored_password("service-9"), ("service-9", "pwd-9"))
+        self.assertFalse(os.path.exists(f"{source_file_path}.checkpoint"))
+
+    def test_lookups_do_not_decrypt(self):
+        with redirect_stdout(StringIO()):
+            self.handler.store_multiple_passwords(["linkedin", "github"])
+            self.handler.compact_storage(wait=True)
+        handler = self._setup_handler("work", "secret")
+
+        def decrypt_string(s):
+            raise AssertionError("lookups should not decrypt")
+        handler.crypto_handler.decrypt_string = decrypt_string
+        with redirect_stdout(StringIO()):
+            self.assertTrue(handler.check_if_password_stored_by_service_name("GitHub"))
+            handler.regenerate_service_password("github")
+            handler.delete_password_from_storage("linkedin")
+            handler.store_multiple_passwords(["google"])
+        self.assertEqual(handler.get_stored_passwords_num(), 2)
+
+    def test_csv_sidecar_index_is_rebuilt(self):
+        crypto_handler = self.handler.crypto_handler
+        storage_csv_file_path = f"{PasswordStorageHandler._data_directory_path}/storages/work.csv"
+        with open(storage_csv_file_path, "w") as f:
+            writer(f).writerows(
+                (
+                    ("Service name", "Password"),
+                    (crypto_handler.crypt_string("LinkedIn"), crypto_handler.crypt_string("pwd")),
+                )
+            )
+        handler = self._setup_handler("work", "secret")
+        self.assertTrue(handler.check_if_password_stored_by_service_name("linkedin"))
+        self.assertTrue(
+            os.path.exists(f"{PasswordStorageHandler._data_directory_path}/storages/work.idx")
+        )
+        with open(storage_csv_file_path, "a") as f:
+            writer(f).writerow(
+                (crypto_handler.crypt_string("github"), crypto_handler.crypt_string("pwd"))
+            )
+        handler = self._setup_handler("work", "secret")
+        self.assertTrue(handler.check_if_password_stored_by_service_name("github"))
+        self.assertEqual(handler.get_stored_passwords_num(), 2)
+
+    def test_concurrent_writer_processes(self):
+        workers_num, passwords_num = 8, 30
+        workers = [
+            Process(
+                target=_store_passwords_concurrently,
+                args=(PasswordStorageHandler._data_directory_path, i, passwords_num)
+            )
+            for i in range(workers_num)
+        ]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+            self.assertEqual(w.exitcode, 0)
+        handler = self._setup_handler("work", "secret")
+        self.assertEqual(handler.get_stored_passwords_num(), workers_num * passwords_num + 1)
+        output_file_path = f"{PasswordStorageHandler._data_directory_path}/export.csv"
+        with redirect_stdout(StringIO()):
+            handler.decrypt_storage(output_file_path=output_file_path)
+        with open(output_file_path) as f:
+            self.assertEqual(
+                sorted(r[0] for i, r in enumerate(reader(f)) if i and r),
+                sorted(
+                    [
+                        "shared",
+                        *(f"worker{w}-service{i}" for w in range(workers_num) for i in range(passwords_num))
+                    ]
+                )
+            )
+
+
+class TestPasswordStorageBackends(unittest.TestCase):
+    def setUp(self):
+        _clear_environment(self)
+        self.data_directory = TemporaryDirectory()
+        self.addCleanup(self.data_directory.cleanup)
+
+    def _setup_handler(self, storage_backend, secret_key="secret"):
+        handler = PasswordStorageHandler(
+            "work", secret_key, storage_backend=storage_backend, data_directory_path=self.data_directory.name
+        )
+        with redirect_stdout(StringIO()):
+            handler.setup_storage()
+        self.addCleanup(handler.close)
+        return handler
+
+    def _check_storage_backend(self, storage_backend):
+        handler = self._setup_handler(storage_backend)
+        self.addCleanup(
+            PasswordStorageHandler._storage_backends.pop, (storage_backend, self.data_directory.name)
+        )
+        with redirect_stdout(StringIO()):
+            handler.store_multiple_passwords(["linkedin", "GitHub", "gitlab"])
+            stored_row = handler._get_stored_row("github")
+            handler.regenerate_service_password("GITHUB")
+            handler.delete_password_from_storage("gitlab")
+        self.assertEqual(handler._get_stored_row("github")[0], stored_row[0])
+        self.assertNotEqual(handler._get_stored_row("github")[1], stored_row[1])
+        reloaded_handler = self._setup_handler(storage_backend)
+        self.assertEqual(reloaded_handler.get_stored_passwords_num(), 2)
+        self.assertFalse(reloaded_handler.check_if_password_stored_by_service_name("gitlab"))
+        with redirect_stdout(StringIO()):
+            reloaded_handler.rekey_storage("new-secret")
+        handler = self._setup_handler(storage_backend, "new-secret")
+        output_file_path = f"{self.data_directory.name}/export.csv"
+        with redirect_stdout(StringIO()):
+            handler.decrypt_storage(output_file_path=output_file_path)
+        with open(output_file_path) as f:
+            self.assertEqual(sorted(r[0] for r in reader(f) if r), ["GitHub", "Service name", "linkedin"])
+        self.assertEqual(
+            PasswordStorageHandler.get_storages(
+                str_output=True, storage_backend=handler.storage_backend
+            ),
+            "work"
+        )
+        return handler
+
+    def test_filesystem_backend(self):
+        self._check_storage_backend("filesystem")
+        self.assertTrue(os.path.exists(f"{self.data_directory.name}/storages_index.json"))
+
+    def test_memory_backend(self):
+        self._check_storage_backend("memory")
+        self.assertEqual(os.listdir(self.data_directory.name), ["export.csv"])
+
+    def test_sqlite_backend(self):
+        handler = self._check_storage_backend("sqlite")
+        self.addCleanup(handler.storage_backend.close)
+        self.assertEqual(
+            sorted(n for n in os.listdir(self.data_directory.name) if not n.endswith(("-wal", "-shm"))),
+            ["export.csv", "storages.sqlite3"]
+        )
+        connection = handler.storage_backend._get_connection()
+        self.assertEqual(connection.execute("PRAGMA journal_mode").fetchone()[0], "wal")
+        self.assertEqual(
+            [
+                r[0] for r in connection.execute(
+                    "SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'passwords'"
+                )
+            ],
+            ["passwords_service_name_key_unique_idx"]
+        )
+
+    def test_sqlite_batch_rollback(self):
+        handler = self._setup_handler("sqlite")
+        self.addCleanup(PasswordStorageHandler._storage_backends.pop, ("sqlite", self.data_directory.name))
+        self.addCleanup(handler.storage_backend.close)
+        with redirect_stdout(StringIO()):
+            handler.store_single_password("linkedin")
+            with self.assertRaises(RuntimeError):
+                with handler.batch():
+                    handler.store_multiple_passwords(["github", "gitlab"])
+                    raise RuntimeError()
+        self.assertEqual(handler.get_stored_passwords_num(), 1)
+        self.assertFalse(handler.check_if_password_stored_by_service_name("github"))
+
+    def test_handlers_of_a_rekeyed_storage(self):
+        # a handler set up before the storage was rekeyed by another one does
+        # not write rows encrypted with the former secret key
+        for storage_backend in ("filesystem", "memory", "sqlite"):
+            with self.subTest(storage_backend=storage_backend):
+                self.addCleanup(
+                    PasswordStorageHandler._storage_backends.pop, (storage_backend, self.data_directory.name)
+                )
+                handler = self._setup_handler(storage_backend)
+                stale_handler = self._setup_handler(storage_backend)
+                with redirect_stdout(StringIO()):
+                    handler.store_multiple_passwords(["github"])
+                    handler.rekey_storage(f"{storage_backend}-secret")
+                with self.assertRaisesRegex(ValueError, "has been changed"):
+                    stale_handler.store_multiple_passwords(["zoom"])
+                handler = self._setup_handler(storage_backend, f"{storage_backend}-secret")
+                self.assertEqual(handler.get_stored_passwords_num(), 1)
+                self.assertTrue(handler.check_if_password_stored_by_service_name("github"))
+
+    def test_sqlite_concurrent_batches(self):
+        # the batches of two storages written from two threads do not share
+        # a transaction, the rolled back one is not committed by the other
+        from threading import Event, Thread
+        from time import sleep
+        handler = self._setup_handler("sqlite")
+        self.addCleanup(PasswordStorageHandler._storage_backends.pop, ("sqlite", self.data_directory.name))
+        self.addCleanup(handler.storage_backend.close)
+        other_handler = PasswordStorageHandler(
+            "home", "secret", storage_backend="sqlite", data_directory_path=self.data_directory.name
+        )
+        with redirect_stdout(StringIO()):
+            other_handler.setup_storage()
+        self.addCleanup(other_handler.close)
+        stored, other_storing, errors = Event(), Event(), []
+
+        def rolled_back_batch():
+            try:
+                with handler.batch():
+                    handler.store_multiple_passwords(["github"])
+                    stored.set()
+                    other_storing.wait(5)
+                    sleep(0.1)
+                    raise RuntimeError()
+            except RuntimeError:
+                pass
+            except Exception as e:
+                errors.append(e)
+
+        def committed_batch():
+            stored.wait(5)
+            other_storing.set()
+            try:
+                other_handler.store_multiple_passwords(["gitlab"])
+            except Exception as e:
+                errors.append(e)
+
+        threads = [Thread(target=rolled_back_batch), Thread(target=committed_batch)]
+        with redirect_stdout(StringIO()):
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        self.assertEqual(errors, [])
+        self.assertEqual(handler.get_stored_passwords_num(), 0)
+        self.assertTrue(other_handler.check_if_password_stored_by_service_name("gitlab"))
+
+    def test_sqlite_rekey_rollback(self):
+        handler = self._setup_handler("sqlite")
+        self.addCleanup(PasswordStorageHandler._storage_backends.pop, ("sqlite", self.data_directory.name))
+        self.addCleanup(handler.storage_backend.close)
+        with redirect_stdout(StringIO()):
+            handler.store_multiple_passwords(["linkedin", "github"])
+        stored_row = handler._get_stored_row("github")
+        # the rows are not rekeyed without the index entry
+        with unittest.mock.patch.object(
+            handler.storage_backend, "update_storages_index", side_effect=OSError
+        ), self.assertRaises(OSError):
+            handler.rekey_storage("new-secret")
+        handler = self._setup_handler("sqlite")
+        self.assertEqual(handler._get_stored_row("github"), stored_row)
+
+    def test_migrate_storage(self):
+        handler = self._setup_handler("filesystem")
+        self.addCleanup(PasswordStorageHandler._storage_backends.pop, ("filesystem", self.data_directory.name))
+        self.addCleanup(PasswordStorageHandler._storage_backends.pop, ("sqlite", self.data_directory.name))
+        with redirect_stdout(StringIO()):
+            handler.store_multiple_passwords(["linkedin", "GitHub"])
+            handler.compact_storage(wait=True)
+            # rows still in the journal are migrated too
+            handler.store_single_password("gitlab")
+            handler.migrate_storage("sqlite")
+            with self.assertRaises(ValueError):
+                handler.migrate_storage("sqlite")
+        migrated_handler = self._setup_handler("sqlite")
+        self.addCleanup(migrated_handler.storage_backend.close)
+        self.assertEqual(migrated_handler.storage_format, "sqlite")
+        self.assertEqual(migrated_handler.get_stored_passwords_num(), 3)
+        self.assertEqual(migrated_handler._get_stored_row("github"), handler._get_stored_row("github"))
+        self.assertTrue(PasswordStorageHandler.check_storage_existence("work", handler.storage_backend))
+
+    def test_storage_backend_env_variables(self):
+        with unittest.mock.patch.dict(
+            os.environ,
+            {
+                "PASSWORDS_MANAGER_STORAGE_BACKEND": "filesystem",
+                "PASSWORDS_MANAGER_DATA_DIRECTORY": self.data_directory.name
+            }
+        ):
+            handler = PasswordStorageHandler("work", "secret")
+            self.addCleanup(
+                PasswordStorageHandler._storage_backends.pop, ("filesystem", self.data_directory.name)
+            )
+            with redirect_stdout(StringIO()):
+                handler.setup_storage()
+                handler.store_single_password("linkedin")
+            self.assertTrue(PasswordStorageHandler.check_storage_existence("work"))
+        self.assertTrue(os.path.exists(f"{self.data_directory.name}/storages/work.journal"))
+        with self.assertRaises(ValueError):
+            PasswordStorageHandler("work", "secret", storage_backend="nfs")
+
+
+if __name__ == "__main__":
+    unittest.main()
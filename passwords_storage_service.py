@@ -0,0 +1,206 @@
+from passwords_storage_handler import PasswordStorageHandler
+from storage_io_handler import StorageIOHandler
+from contextlib import redirect_stdout
+from collections import defaultdict
+from os import devnull, remove
+from os.path import exists
+import asyncio
+import json
+import sys
+
+
+class PasswordStorageService:
+    # storages stay authenticated and loaded between requests, requests are
+    # newline delimited json objects, operations on the same storage are
+    # serialized by an asyncio lock
+    _operations = ("store", "regenerate", "delete", "export")
+
+    def __init__(self, socket_path=None):
+        self.socket_path = socket_path or PasswordStorageService.get_default_socket_path()
+        self._storage_handlers = {}
+        self._storage_locks = defaultdict(asyncio.Lock)
+        self._devnull = open(devnull, "w")
+
+    @staticmethod
+    def get_default_socket_path():
+        return f"{PasswordStorageHandler.get_data_directory_path()}/passwords_storage_service.sock"
+
+    def _get_storage_handler(self, storage_name, secret_key):
+        # the index entry is checked on every request through the sessions
+        # cache, so that a storage rekeyed, converted or deleted by another
+        # process is not used with its former key or format
+        storage_handler = self._storage_handlers.get(storage_name)
+        session = PasswordStorageHandler._open_session(
+            storage_name,
+            secret_key,
+            storage_handler.storage_backend if storage_handler else PasswordStorageHandler.get_storage_backend()
+        )
+        if not session:
+            raise ValueError(f"There are no storages with this name: '{storage_name}'!")
+        if (
+            not storage_handler
+            or storage_handler.secret_key != secret_key
+            or storage_handler.current_storage != session[0]
+        ):
+            new_storage_handler = PasswordStorageHandler(storage_name, secret_key)
+            new_storage_handler.setup_storage()
+            if storage_handler:
+                storage_handler.close()
+            self._storage_handlers[storage_name] = storage_handler = new_storage_handler
+        return storage_handler
+
+    def _export(self, storage_handler, service_name_pattern=None, output_file_path=None):
+        from csv import writer
+        decrypted_rows = storage_handler._iter_decrypted_rows(service_name_pattern)
+        if output_file_path:
+            with StorageIOHandler.atomic_write(output_file_path) as f:
+                writer(f).writerows(
+                    (PasswordStorageHandler._storage_csv_file_headers, *decrypted_rows)
+                )
+            return output_file_path
+        return [list(r) for r in decrypted_rows]
+
+    def _run_operation(self, operation, request):
+        storage_handler = self._get_storage_handler(
+            request["storage_name"], request["secret_key"]
+        )
+        if operation == "store":
+            return storage_handler.store_multiple_passwords(
+                request["service_names"],
+                on_conflict=request.get("on_conflict", "skip")
+            )
+        elif operation == "regenerate":
+            if not storage_handler.check_if_password_stored_by_service_name(request["service_name"]):
+                return False
+            storage_handler.regenerate_service_password(request["service_name"])
+            return True
+        elif operation == "delete":
+            return bool(storage_handler.delete_password_from_storage(
+                request["service_name"], internal_use=True
+            ))
+        return self._export(
+            storage_handler,
+            request.get("service_name_pattern"),
+            request.get("output_file_path")
+        )
+
+    async def _handle_request(self, request):
+        operation = request.get("operation")
+        if operation not in PasswordStorageService._operations:
+            raise ValueError(f"Unknown operation: '{operation}'")
+        async with self._storage_locks[request["storage_name"]]:
+            # the operations wait for files, databases and the locks of other
+            # processes, they run in a thread so that the other storages are
+            # still served
+            return await asyncio.to_thread(self._run_operation, operation, request)
+
+    async def _handle_client(self, reader, writer):
+        try:
+            while l := await reader.readline():
+                try:
+                    response = {"ok": True, "result": await self._handle_request(json.loads(l))}
+                except (ValueError, KeyError, TypeError) as e:
+                    response = {"ok": False, "error": str(e)}
+                except Exception as e:
+                    # the storage may be unreadable or the export path not
+                    # writable, the client is told and the service keeps on
+                    response = {"ok": False, "error": f"{e.__class__.__name__}: {e}"}
+                writer.write(json.dumps(response).encode() + b"\n")
+                await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve(self, ready=None):
+        if exists(self.socket_path):
+            remove(self.socket_path)
+        server = await asyncio.start_unix_server(
+            self._handle_client, path=self.socket_path, limit=2 ** 24
+        )
+        if ready:
+            ready()
+        try:
+            # the handlers print their outcome, which is not meaningful for
+            # clients. Standard output is redirected once, for the whole
+            # service, since the operations run in several threads
+            with redirect_stdout(self._devnull):
+                async with server:
+                    await server.serve_forever()
+        finally:
+            self.close()
+
+    def close(self):
+        for storage_handler in self._storage_handlers.values():
+            storage_handler.close()
+        self._storage_handlers.clear()
+        self._devnull.close()
+        if exists(self.socket_path):
+            remove(self.socket_path)
+
+
+class PasswordStorageClient:
+    def __init__(self, storage_name, secret_key, socket_path=None):
+        self.storage_name = storage_name
+        self.secret_key = secret_key
+        self.socket_path = socket_path or PasswordStorageService.get_default_socket_path()
+        self._reader, self._writer = None, None
+        self._lock = asyncio.Lock()
+
+    async def connect(self):
+        self._reader, self._writer = await asyncio.open_unix_connection(
+            self.socket_path, limit=2 ** 24
+        )
+        return self
+
+    async def close(self):
+        if self._writer:
+            self._writer.close()
+            await self._writer.wait_closed()
+            self._reader, self._writer = None, None
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def _request(self, operation, **kwargs):
+        async with self._lock:
+            self._writer.write(
+                json.dumps(
+                    {
+                        "operation": operation,
+                        "storage_name": self.storage_name,
+                        "secret_key": self.secret_key,
+                        **kwargs
+                    }
+                ).encode() + b"\n"
+            )
+            await self._writer.drain()
+            response = json.loads(await self._reader.readline())
+        if not response["ok"]:
+            raise ValueError(response["error"])
+        return response["result"]
+
+    async def store_multiple_passwords(self, service_names, on_conflict="skip"):
+        return await self._request("store", service_names=list(service_names), on_conflict=on_conflict)
+
+    async def regenerate_service_password(self, service_name):
+        return await self._request("regenerate", service_name=service_name)
+
+    async def delete_password_from_storage(self, service_name):
+        return await self._request("delete", service_name=service_name)
+
+    async def decrypt_storage(self, service_name_pattern=None, output_file_path=None):
+        return await self._request(
+            "export",
+            service_name_pattern=service_name_pattern,
+            output_file_path=output_file_path
+        )
+
+
+if __name__ == "__main__":
+    service = PasswordStorageService(sys.argv[1] if len(sys.argv) > 1 else None)
+    try:
+        asyncio.run(service.serve(lambda: print(f"Listening on {service.socket_path} ...")))
+    except KeyboardInterrupt:
+        print("Bye bye!")
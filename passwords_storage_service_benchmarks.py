@@ -0,0 +1,69 @@
+from passwords_storage_service import PasswordStorageService, PasswordStorageClient
+from passwords_storage_handler import PasswordStorageHandler
+from passwords_storage_handler_benchmarks import temporary_data_directory
+from contextlib import redirect_stdout
+from multiprocessing import Process
+from os.path import exists
+from time import perf_counter, sleep
+from io import StringIO
+import asyncio
+
+
+def _run_service(data_directory_path, socket_path):
+    PasswordStorageHandler._data_directory_path = data_directory_path
+    asyncio.run(PasswordStorageService(socket_path).serve())
+
+
+async def _run_client(client_id, socket_path, storages_num, ops_num, latencies):
+    async with PasswordStorageClient(f"storage-{client_id % storages_num}", "secret", socket_path) as client:
+        for i in range(ops_num):
+            service_name = f"service-{client_id}-{i}"
+            for operation in (
+                lambda: client.store_multiple_passwords([service_name]),
+                lambda: client.regenerate_service_password(service_name),
+                lambda: client.delete_password_from_storage(service_name)
+            ):
+                start = perf_counter()
+                await operation()
+                latencies.append(perf_counter() - start)
+
+
+async def _run_clients(socket_path, clients_num, storages_num, ops_num):
+    latencies = []
+    start = perf_counter()
+    await asyncio.gather(
+        *(_run_client(i, socket_path, storages_num, ops_num, latencies) for i in range(clients_num))
+    )
+    return perf_counter() - start, sorted(latencies)
+
+
+def benchmark_service(clients_num=50, storages_num=5, ops_num=100):
+    with temporary_data_directory() as data_directory_path:
+        with redirect_stdout(StringIO()):
+            for i in range(storages_num):
+                PasswordStorageHandler(f"storage-{i}", "secret").setup_storage()
+        socket_path = f"{data_directory_path}/service.sock"
+        service_process = Process(target=_run_service, args=(data_directory_path, socket_path))
+        service_process.start()
+        try:
+            while not exists(socket_path):
+                sleep(0.01)
+            wall_time, latencies = asyncio.run(
+                _run_clients(socket_path, clients_num, storages_num, ops_num)
+            )
+        finally:
+            service_process.terminate()
+            service_process.join()
+    return {
+        "ops": len(latencies),
+        "ops_per_second": len(latencies) / wall_time,
+        "p50_latency": latencies[len(latencies) // 2],
+        "p99_latency": latencies[int(len(latencies) * 0.99)]
+    }
+
+
+if __name__ == "__main__":
+    results = benchmark_service()
+    print(
+        f"{results['ops']} ops: {results['ops_per_second']:,.0f} ops/s, p50 {results['p50_latency'] * 1000:.2f} ms, p99 {results['p99_latency'] * 1000:.2f} ms"
+    )
@@ -0,0 +1,99 @@
+from passwords_storage_service import PasswordStorageService, PasswordStorageClient
+from passwords_storage_handler import PasswordStorageHandler
+from passwords_storage_handler_benchmarks import temporary_data_directory
+from storage_io_handler import StorageIOHandler
+from contextlib import redirect_stdout
+from io import StringIO
+import asyncio
+import unittest
+
+
+class TestPasswordStorageService(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        data_directory = temporary_data_directory()
+        data_directory_path = data_directory.__enter__()
+        self.addCleanup(data_directory.__exit__, None, None, None)
+        with redirect_stdout(StringIO()):
+            PasswordStorageHandler("work", "secret").setup_storage()
+            PasswordStorageHandler("home", "secret").setup_storage()
+        self.service = PasswordStorageService(f"{data_directory_path}/service.sock")
+        ready = asyncio.Event()
+        self.service_task = asyncio.create_task(self.service.serve(ready.set))
+        await ready.wait()
+
+    async def asyncTearDown(self):
+        self.service_task.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await self.service_task
+
+    async def test_operations(self):
+        async with PasswordStorageClient("work", "secret", self.service.socket_path) as client:
+            self.assertEqual(await client.store_multiple_passwords(["linkedin", "github"]), [])
+            self.assertEqual(await client.store_multiple_passwords(["LinkedIn"]), ["LinkedIn"])
+            self.assertTrue(await client.regenerate_service_password("github"))
+            self.assertFalse(await client.delete_password_from_storage("google"))
+            self.assertTrue(await client.delete_password_from_storage("linkedin"))
+            decrypted_rows = await client.decrypt_storage()
+        self.assertEqual([r[0] for r in decrypted_rows], ["github"])
+        self.assertEqual(decrypted_rows[0][1][5:-5].lower(), "github")
+
+    async def test_concurrent_clients(self):
+        clients = [
+            await PasswordStorageClient("work", "secret", self.service.socket_path).connect()
+            for i in range(10)
+        ]
+        await asyncio.gather(
+            *(
+                c.store_multiple_passwords([f"service{i}-{j}" for j in range(10)])
+                for i, c in enumerate(clients)
+            )
+        )
+        self.assertEqual(len(await clients[0].decrypt_storage()), 100)
+        for c in clients:
+            await c.close()
+
+    async def test_errors(self):
+        async with PasswordStorageClient("work", "wrong", self.service.socket_path) as client:
+            with self.assertRaises(ValueError):
+                await client.store_multiple_passwords(["linkedin"])
+        async with PasswordStorageClient("personal", "secret", self.service.socket_path) as client:
+            with self.assertRaises(ValueError):
+                await client.delete_password_from_storage("linkedin")
+        async with PasswordStorageClient("work", "secret", self.service.socket_path) as client:
+            # the export directory does not exist
+            with self.assertRaisesRegex(ValueError, "FileNotFoundError"):
+                await client.decrypt_storage(output_file_path="/nonexistent/work.csv")
+            self.assertEqual(await client.decrypt_storage(), [])
+
+    async def test_storage_locked_by_another_process(self):
+        # a storage locked elsewhere does not stall the requests on the others
+        lock_file = StorageIOHandler.acquire_lock(
+            PasswordStorageHandler("work", "secret")._storage_lock_file_path
+        )
+        async with PasswordStorageClient("work", "secret", self.service.socket_path) as work_client, \
+                PasswordStorageClient("home", "secret", self.service.socket_path) as home_client:
+            work_request = asyncio.create_task(work_client.store_multiple_passwords(["github"]))
+            self.assertEqual(
+                await asyncio.wait_for(home_client.store_multiple_passwords(["github"]), 5), []
+            )
+            self.assertFalse(work_request.done())
+            StorageIOHandler.release_lock(lock_file)
+            self.assertEqual(await asyncio.wait_for(work_request, 5), [])
+
+    async def test_storage_rekeyed_by_another_process(self):
+        async with PasswordStorageClient("work", "secret", self.service.socket_path) as client:
+            await client.store_multiple_passwords(["github"])
+            with redirect_stdout(StringIO()):
+                storage_handler = PasswordStorageHandler("work", "secret")
+                storage_handler.setup_storage()
+                storage_handler.rekey_storage("new-secret")
+                storage_handler.close()
+            with self.assertRaisesRegex(ValueError, "Incorrect secret key"):
+                await client.store_multiple_passwords(["gitlab"])
+        async with PasswordStorageClient("work", "new-secret", self.service.socket_path) as client:
+            self.assertEqual(await client.store_multiple_passwords(["gitlab"]), [])
+            self.assertEqual(sorted(r[0] for r in await client.decrypt_storage()), ["github", "gitlab"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,311 @@
+from storage_io_handler import StorageIOHandler
+from json import load, dump
+from contextlib import contextmanager, nullcontext
+from os import makedirs, remove, stat
+from os.path import exists
+from threading import Lock, local
+
+# a backend stores the storages index and the rows of every storage, rows
+# are (key, crypted service name, crypted password) where the key is the
+# normalized crypted service name. Storage files of journaled backends are
+# read only, the handler journals the changes and compacts them into a new
+# file; the other backends open storages that are updated in place
+
+
+class FilesystemStorageBackend:
+    journaled = True
+    storage_formats = ("csv", "binary")
+
+    def __init__(self, data_directory_path):
+        self.data_directory_path = data_directory_path
+        self.storages_index_file_path = f"{data_directory_path}/storages_index.json"
+        self._storages_index_cache, self._storages_index_cache_key = {}, None
+
+    def _get_storages_index_file_key(self):
+        try:
+            s = stat(self.storages_index_file_path)
+        except FileNotFoundError:
+            return None
+        return (s.st_ino, s.st_mtime_ns, s.st_size)
+
+    def load_storages_index(self, lock=True):
+        storages_index_file_key = self._get_storages_index_file_key()
+        if not storages_index_file_key:
+            self._storages_index_cache = {}
+        elif self._storages_index_cache_key != storages_index_file_key:
+            with StorageIOHandler.locked(self.storages_index_file_path, shared=True) if lock else nullcontext():
+                with open(self.storages_index_file_path) as f:
+                    self._storages_index_cache = {
+                        s["name"]: s for s in load(f)["storages_index"]
+                    }
+        self._storages_index_cache_key = storages_index_file_key
+        return self._storages_index_cache
+
+    def update_storages_index(self, storage):
+        makedirs(f"{self.data_directory_path}/storages", exist_ok=True)
+        with StorageIOHandler.locked(self.storages_index_file_path):
+            storages_index = {**self.load_storages_index(lock=False), storage["name"]: storage}
+            with StorageIOHandler.atomic_write(self.storages_index_file_path) as f:
+                dump({"storages_index": list(storages_index.values())}, f)
+            self._storages_index_cache = storages_index
+            self._storages_index_cache_key = self._get_storages_index_file_key()
+
+    def get_storage_file_path(self, storage_name, extension=""):
+        return f"{self.data_directory_path}/storages/{storage_name}{extension}"
+
+    def get_storage_file_paths(self, storage_name, storage_format):
+        if storage_format == "binary":
+            return (self.get_storage_file_path(storage_name, ".bin"),)
+        return (
+            self.get_storage_file_path(storage_name, ".csv"),
+            self.get_storage_file_path(storage_name, ".idx")
+        )
+
+    def open_storage(self, storage_name, storage_format, normalize_service_name):
+        if storage_format == "binary":
+            from binary_storage_handler import BinaryStorageHandler
+            return BinaryStorageHandler(*self.get_storage_file_paths(storage_name, storage_format))
+        from csv_storage_handler import CsvStorageHandler
+        return CsvStorageHandler(
+            *self.get_storage_file_paths(storage_name, storage_format), normalize_service_name
+        )
+
+    def write_storage(self, storage_name, storage_format, keyed_rows, file_path_suffix=""):
+        file_paths = [
+            f"{p}{file_path_suffix}" for p in self.get_storage_file_paths(storage_name, storage_format)
+        ]
+        if storage_format == "binary":
+            from binary_storage_handler import BinaryStorageHandler
+            BinaryStorageHandler.write(*file_paths, keyed_rows)
+        else:
+            from csv_storage_handler import CsvStorageHandler
+            CsvStorageHandler.write(*file_paths, keyed_rows)
+
+    def remove_storage(self, storage_name, storage_format):
+        for file_path in self.get_storage_file_paths(storage_name, storage_format):
+            if exists(file_path):
+                remove(file_path)
+
+    def get_export_file_path(self, storage_name):
+        makedirs(f"{self.data_directory_path}/decrypted_storages", exist_ok=True)
+        return f"{self.data_directory_path}/decrypted_storages/{storage_name}.csv"
+
+
+class MemoryStorage:
+    def __init__(self, backend, storage_name):
+        self._backend = backend
+        self._storage_name = storage_name
+
+    @property
+    def _rows(self):
+        return self._backend._storages.setdefault(self._storage_name, {})
+
+    @property
+    def rows_num(self):
+        return len(self._rows)
+
+    def lookup(self, key):
+        return self._rows.get(key)
+
+    def __iter__(self):
+        return ((k, *r) for k, r in self._rows.items())
+
+    def put_many(self, keyed_rows):
+        self._rows.update(keyed_rows)
+
+    def delete(self, key):
+        self._rows.pop(key, None)
+
+    # changes are applied right away, they cannot be rolled back
+    def begin(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class MemoryStorageBackend:
+    # nothing is persisted, storages live as long as the process
+    journaled = False
+    storage_formats = ("memory",)
+
+    def __init__(self, data_directory_path=None):
+        self.data_directory_path = data_directory_path
+        self._storages_index, self._storages = {}, {}
+
+    def load_storages_index(self):
+        return self._storages_index
+
+    def update_storages_index(self, storage):
+        self._storages_index[storage["name"]] = storage
+
+    def open_storage(self, storage_name, storage_format, normalize_service_name):
+        return MemoryStorage(self, storage_name)
+
+    def write_storage(self, storage_name, storage_format, keyed_rows):
+        self._storages[storage_name] = {k: (n, p) for k, n, p in keyed_rows}
+
+    def remove_storage(self, storage_name, storage_format):
+        self._storages.pop(storage_name, None)
+
+    def get_export_file_path(self, storage_name):
+        raise ValueError("in-memory storages have no export directory, pass an output file")
+
+
+class SqliteStorage:
+    def __init__(self, backend, storage_name):
+        self._backend = backend
+        self._storage_name = storage_name
+
+    @property
+    def rows_num(self):
+        return self._backend._get_connection().execute(
+            "SELECT count(*) FROM passwords WHERE storage_name = ?", (self._storage_name,)
+        ).fetchone()[0]
+
+    def lookup(self, key):
+        return self._backend._get_connection().execute(
+            "SELECT service_name, password FROM passwords WHERE storage_name = ? AND service_name_key = ?",
+            (self._storage_name, key)
+        ).fetchone()
+
+    def __iter__(self):
+        return self._backend._get_connection().execute(
+            "SELECT service_name_key, service_name, password FROM passwords WHERE storage_name = ?",
+            (self._storage_name,)
+        )
+
+    def put_many(self, keyed_rows):
+        self._backend._get_connection().executemany(
+            "INSERT OR REPLACE INTO passwords VALUES (?, ?, ?, ?)",
+            ((self._storage_name, k, *r) for k, r in keyed_rows)
+        )
+
+    def delete(self, key):
+        self._backend._get_connection().execute(
+            "DELETE FROM passwords WHERE storage_name = ? AND service_name_key = ?",
+            (self._storage_name, key)
+        )
+
+    def begin(self):
+        # takes the write lock right away, so that what is read in the
+        # transaction cannot be changed by other processes before it commits
+        connection = self._backend._get_connection()
+        if not connection.in_transaction:
+            connection.execute("BEGIN IMMEDIATE")
+
+    def commit(self):
+        self._backend._get_connection().commit()
+
+    def rollback(self):
+        self._backend._get_connection().rollback()
+
+    def close(self):
+        pass
+
+
+class SqliteStorageBackend:
+    # the storages index and the rows of every storage in one database file,
+    # in WAL mode readers do not block the writer and the other way around
+    journaled = False
+    storage_formats = ("sqlite",)
+
+    def __init__(self, data_directory_path):
+        self.data_directory_path = data_directory_path
+        self.database_file_path = f"{data_directory_path}/storages.sqlite3"
+        # every thread has its own connection, so that the transactions of
+        # the storages used at once by the service threads do not mix
+        self._local, self._connections, self._connections_lock = local(), [], Lock()
+
+    def _get_connection(self):
+        connection = getattr(self._local, "connection", None)
+        if not connection:
+            import sqlite3
+            makedirs(self.data_directory_path, exist_ok=True)
+            # the connections of all the threads are closed by close()
+            connection = sqlite3.connect(self.database_file_path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            connection.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS storages (
+                    name TEXT PRIMARY KEY, secret_key TEXT NOT NULL, format TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS passwords (
+                    storage_name TEXT NOT NULL,
+                    service_name_key TEXT NOT NULL,
+                    service_name TEXT NOT NULL,
+                    password TEXT NOT NULL
+                );
+                CREATE UNIQUE INDEX IF NOT EXISTS passwords_service_name_key_unique_idx
+                    ON passwords (storage_name, service_name_key);
+                """
+            )
+            self._local.connection = connection
+            with self._connections_lock:
+                self._connections.append(connection)
+        return connection
+
+    @contextmanager
+    def _transaction(self):
+        # changes made in a transaction begun by the handler are committed,
+        # or rolled back, with it
+        connection = self._get_connection()
+        if connection.in_transaction:
+            yield connection
+            return
+        with connection:
+            yield connection
+
+    def load_storages_index(self):
+        return {
+            name: {"name": name, "secret_key": secret_key, "format": storage_format}
+            for name, secret_key, storage_format in self._get_connection().execute(
+                "SELECT name, secret_key, format FROM storages"
+            )
+        }
+
+    def update_storages_index(self, storage):
+        with self._transaction() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO storages VALUES (?, ?, ?)",
+                (storage["name"], storage["secret_key"], storage["format"])
+            )
+
+    def open_storage(self, storage_name, storage_format, normalize_service_name):
+        return SqliteStorage(self, storage_name)
+
+    def write_storage(self, storage_name, storage_format, keyed_rows):
+        # the rows can be streamed from the storage being rewritten, they are
+        # staged in a temporary table first
+        with self._transaction() as connection:
+            connection.execute(
+                "CREATE TEMP TABLE IF NOT EXISTS rewritten_passwords (service_name_key, service_name, password)"
+            )
+            connection.executemany("INSERT INTO rewritten_passwords VALUES (?, ?, ?)", keyed_rows)
+            connection.execute("DELETE FROM passwords WHERE storage_name = ?", (storage_name,))
+            connection.execute(
+                "INSERT INTO passwords SELECT ?, * FROM rewritten_passwords", (storage_name,)
+            )
+            connection.execute("DELETE FROM rewritten_passwords")
+
+    def remove_storage(self, storage_name, storage_format):
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM passwords WHERE storage_name = ?", (storage_name,))
+
+    def get_export_file_path(self, storage_name):
+        makedirs(f"{self.data_directory_path}/decrypted_storages", exist_ok=True)
+        return f"{self.data_directory_path}/decrypted_storages/{storage_name}.csv"
+
+    def close(self):
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+            self._local = local()
+        for connection in connections:
+            connection.close()
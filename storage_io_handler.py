@@ -0,0 +1,64 @@
+from contextlib import contextmanager
+from fcntl import flock, LOCK_EX, LOCK_NB, LOCK_SH, LOCK_UN
+from os import close, fsync, open as os_open, O_RDONLY, remove, replace
+from os.path import basename, dirname
+
+
+class StorageIOHandler:
+    # advisory locks are taken on a '<path>.lock' file next to the locked
+    # file, so that the locked file itself can be atomically replaced
+
+    @staticmethod
+    def acquire_lock(file_path, shared=False, blocking=True):
+        lock_file = open(f"{file_path}.lock", "a")
+        try:
+            flock(lock_file.fileno(), (LOCK_SH if shared else LOCK_EX) | (0 if blocking else LOCK_NB))
+        except BlockingIOError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    @staticmethod
+    def release_lock(lock_file):
+        flock(lock_file.fileno(), LOCK_UN)
+        lock_file.close()
+
+    @classmethod
+    @contextmanager
+    def locked(cls, file_path, shared=False):
+        lock_file = cls.acquire_lock(file_path, shared=shared)
+        try:
+            yield
+        finally:
+            cls.release_lock(lock_file)
+
+    @staticmethod
+    def _fsync_directory(directory_path):
+        directory_fd = os_open(directory_path, O_RDONLY)
+        try:
+            fsync(directory_fd)
+        finally:
+            close(directory_fd)
+
+    @classmethod
+    @contextmanager
+    def atomic_write(cls, file_path, mode="w"):
+        # readers see either the previous or the new content, never a
+        # truncated file, even if the writing process crashes
+        from tempfile import mkstemp
+        tmp_fd, tmp_file_path = mkstemp(
+            dir=dirname(file_path) or ".", prefix=f"{basename(file_path)}.", suffix=".tmp"
+        )
+        try:
+            with open(tmp_fd, mode) as f:
+                yield f
+                f.flush()
+                fsync(f.fileno())
+            replace(tmp_file_path, file_path)
+        except BaseException:
+            try:
+                remove(tmp_file_path)
+            except FileNotFoundError:
+                pass
+            raise
+        cls._fsync_directory(dirname(file_path) or ".")
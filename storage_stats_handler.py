@@ -0,0 +1,118 @@
+from contextlib import contextmanager, nullcontext
+from functools import wraps
+from bisect import bisect_left
+from time import perf_counter
+
+
+class StorageStatsHandler:
+    # operation counters and latency histograms, split into phases, shared
+    # by all the storage handlers of the process. When disabled, timed
+    # operations and phases only check the enabled flag
+    enabled = False
+    phases = ("io", "parse", "crypt", "write")
+    _histogram_bounds = (1e-6, 1e-5, 1e-4, 1e-3, 1e-2, 1e-1, 1, 10)
+    _histogram_labels = ("1us", "10us", "100us", "1ms", "10ms", "100ms", "1s", "10s", "+inf")
+    _null_context = nullcontext()
+    _operations, _phases = {}, {}
+    bytes_read, bytes_written = 0, 0
+    _local = None
+
+    @classmethod
+    def enable(cls):
+        from threading import local
+        # phases are timed per thread, the service exports from worker threads
+        cls._local = cls._local or local()
+        cls.enabled = True
+
+    @classmethod
+    def disable(cls):
+        cls.enabled = False
+
+    @classmethod
+    def reset(cls):
+        cls._operations, cls._phases = {}, {}
+        cls.bytes_read, cls.bytes_written = 0, 0
+
+    @classmethod
+    def _record(cls, latencies, name, elapsed):
+        latency = latencies.get(name)
+        if not latency:
+            latency = latencies[name] = [0, 0.0, [0] * len(cls._histogram_labels)]
+        latency[0] += 1
+        latency[1] += elapsed
+        latency[2][bisect_left(cls._histogram_bounds, elapsed)] += 1
+
+    @classmethod
+    def timed(cls, f):
+        # records the calls of a method, nested calls included
+        @wraps(f)
+        def timed_f(*args, **kwargs):
+            if not cls.enabled:
+                return f(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                cls._record(cls._operations, f.__name__, perf_counter() - start)
+        return timed_f
+
+    @classmethod
+    def phase(cls, name):
+        if not cls.enabled:
+            return cls._null_context
+        return cls._timed_phase(name)
+
+    @classmethod
+    @contextmanager
+    def _timed_phase(cls, name):
+        # the time of nested phases is only accounted to them
+        nested_phases_times = cls._local.__dict__.setdefault("nested_phases_times", [])
+        nested_phases_times.append(0.0)
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = perf_counter() - start
+            cls._record(cls._phases, name, elapsed - nested_phases_times.pop())
+            if nested_phases_times:
+                nested_phases_times[-1] += elapsed
+
+    @classmethod
+    def add_bytes_read(cls, bytes_num):
+        if cls.enabled:
+            cls.bytes_read += bytes_num
+
+    @classmethod
+    def add_bytes_written(cls, bytes_num):
+        if cls.enabled:
+            cls.bytes_written += bytes_num
+
+    @classmethod
+    def stats(cls):
+        def format_latencies(latencies):
+            return {
+                name: {
+                    "count": count,
+                    "total_time": total_time,
+                    "latency_histogram": dict(zip(cls._histogram_labels, histogram))
+                }
+                for name, (count, total_time, histogram) in latencies.items()
+            }
+        return {
+            "operations": format_latencies(cls._operations),
+            "phases": format_latencies(cls._phases),
+            "bytes_read": cls.bytes_read,
+            "bytes_written": cls.bytes_written
+        }
+
+    @classmethod
+    def format_stats(cls):
+        stats = cls.stats()
+        lines = [f"{'operation / phase':<45}{'calls':>8}{'total ms':>12}{'mean ms':>10}"]
+        for section in ("operations", "phases"):
+            for name, s in sorted(stats[section].items(), key=lambda i: -i[1]["total_time"]):
+                lines.append(
+                    f"{name if section == 'operations' else f'[{name}]':<45}{s['count']:>8}{s['total_time'] * 1000:>12.3f}{s['total_time'] * 1000 / s['count']:>10.3f}"
+                )
+        lines.append(f"bytes read: {stats['bytes_read']:,}, bytes written: {stats['bytes_written']:,}")
+        return "\n".join(lines)
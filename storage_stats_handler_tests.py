@@ -0,0 +1,70 @@
+from storage_stats_handler import StorageStatsHandler
+from passwords_storage_handler import PasswordStorageHandler
+from tempfile import TemporaryDirectory
+from contextlib import redirect_stdout
+from io import StringIO
+from time import sleep
+import os
+import unittest
+import unittest.mock
+
+
+class TestStorageStatsHandler(unittest.TestCase):
+    def setUp(self):
+        StorageStatsHandler.reset()
+        StorageStatsHandler.enable()
+        self.addCleanup(StorageStatsHandler.reset)
+        self.addCleanup(StorageStatsHandler.disable)
+
+    def test_nested_phases(self):
+        with StorageStatsHandler.phase("write"):
+            with StorageStatsHandler.phase("crypt"):
+                sleep(0.02)
+        phases = StorageStatsHandler.stats()["phases"]
+        self.assertGreaterEqual(phases["crypt"]["total_time"], 0.02)
+        # the nested phase is not accounted to the outer one
+        self.assertLess(phases["write"]["total_time"], 0.01)
+        self.assertEqual(phases["crypt"]["latency_histogram"]["100ms"], 1)
+        self.assertEqual(sum(phases["crypt"]["latency_histogram"].values()), 1)
+
+    def test_disabled(self):
+        StorageStatsHandler.disable()
+
+        @StorageStatsHandler.timed
+        def operation():
+            with StorageStatsHandler.phase("io"):
+                StorageStatsHandler.add_bytes_read(10)
+
+        operation()
+        self.assertEqual(
+            StorageStatsHandler.stats(),
+            {"operations": {}, "phases": {}, "bytes_read": 0, "bytes_written": 0}
+        )
+
+    def test_storage_handler_stats(self):
+        data_directory = TemporaryDirectory()
+        self.addCleanup(data_directory.cleanup)
+        environ_patch = unittest.mock.patch.dict(os.environ)
+        environ_patch.start()
+        self.addCleanup(environ_patch.stop)
+        os.environ.pop(PasswordStorageHandler._storage_backend_env_variable, None)
+        handler = PasswordStorageHandler("work", "secret", data_directory_path=data_directory.name)
+        self.addCleanup(PasswordStorageHandler._storage_backends.pop, ("filesystem", data_directory.name))
+        self.addCleanup(handler.close)
+        with redirect_stdout(StringIO()):
+            handler.setup_storage()
+            handler.store_multiple_passwords(["github", "gitlab"])
+            handler.compact_storage(wait=True)
+            handler.regenerate_service_password("github")
+            handler.decrypt_storage(output_file_path=f"{data_directory.name}/export.csv")
+        stats = PasswordStorageHandler.stats()
+        self.assertEqual(stats["operations"]["store_multiple_passwords"]["count"], 1)
+        self.assertEqual(stats["operations"]["regenerate_service_password"]["count"], 1)
+        self.assertEqual(set(stats["phases"]), set(StorageStatsHandler.phases))
+        self.assertGreater(stats["bytes_read"], 0)
+        self.assertGreater(stats["bytes_written"], 0)
+        self.assertIn("store_multiple_passwords", StorageStatsHandler.format_stats())
+
+
+if __name__ == "__main__":
+    unittest.main()